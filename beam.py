@@ -0,0 +1,294 @@
+from collections import namedtuple
+from time import perf_counter
+from typing import List
+import math
+import uuid
+
+from shapely.geometry import Polygon
+
+from mocker import polygon_area
+from parallel import InlineExecutor
+
+
+# placers of branches held by this process, by key of their search and id of the branch
+_BRANCHES = {}
+
+# layout kept by a search, placements are a linked list of (placement, previous placements) ending with None,
+# waste is the free area left under placed shapes
+Branch = namedtuple('Branch', ['id', 'placements', 'count', 'area', 'top', 'waste'])
+
+
+class BeamSearch(object):
+    """Beam search over placements of a stream of shapes.
+
+    The greedy placer puts every shape as low as possible and never revisits the choice. The search
+    keeps up to width layouts(branches) instead. Every branch is extended by the lowest placements of
+    the next shape over its orientations and the best extended layouts are kept, a branch that cannot
+    place the shape is finished. Layouts are compared by the free area left under placed shapes, which
+    the occupancy grid estimates for a placement before it is made, then by their density. The first
+    branch places shapes as the greedy placer does.
+
+    Shapes the branches were extended by are pending until commit() decides the first of them as the
+    best branch placed it, branches that placed it otherwise are dropped. The caller commits once all
+    branches agree on it or the branches are deep enough, so the search looks a bounded number of shapes ahead.
+
+    Branches are forks of a placer sharing placed shapes and derived geometry with their parents
+    (see MyPlacer.fork()). A parent becomes one of its children, the others copy the arrays they share
+    with it once, when they place their shape. Branches live in worker processes, every worker holds
+    all of them and extends its share of them in parallel with the others.
+    """
+
+    def __init__(self, placer, width : int, workers : int = 0):
+        """Constructor
+
+        Args:
+            placer (MyPlacer): placer whose placed shapes the search starts from
+            width (int): number of branches kept, also the number of placements every branch is extended by
+            workers (int, optional): number of worker processes, branches are extended in this process if less than 2. Defaults to 0.
+        """
+
+        self._key = uuid.uuid4().hex
+        self._width = width
+        self._radius = placer._sg._radius
+
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            self._executors = [ProcessPoolExecutor(1) for _ in range(min(workers, width))]
+        else:
+            self._executors = [InlineExecutor()]
+        shapes = [list(map(list, s)) for s in placer._sg._shapes]
+        for executor in self._executors:
+            executor.submit(_create, self._key, placer._settings(), shapes).result()
+
+        top = max((p[1] for s in shapes for p in s), default=-self._radius)
+        self._live = [Branch(0, None, len(shapes), placer._sg._shapes.area, top, 0.0)]
+        self._finished = []
+        # number of shapes placed before the first pending one and number of pending shapes
+        self._base = len(shapes)
+        self._depth = 0
+        # whether the last step dropped branches that were not extended in time
+        self._dropped = False
+        # children kept by the last step, the workers make them before the next one
+        self._steps = []
+        self._next = 1
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+    @property
+    def depth(self):
+        """Number of pending shapes, the branches were extended by them and none was committed
+
+        Returns:
+            int: number of shapes
+        """
+
+        return self._depth
+
+
+    @property
+    def dropped(self):
+        """Whether the last step dropped branches because they were not extended in time
+
+        Returns:
+            bool: whether the step was cut short
+        """
+
+        return self._dropped
+
+
+    def step(self, shape : List, budget : float = None):
+        """Extends the branches by a shape
+
+        Args:
+            shape (List(List(int, int))): shape given by its vertices
+            budget (float, optional): seconds available to extend the branches. The first branch of every worker
+                is extended regardless, branches that were not extended in time are dropped. Defaults to None, no limit.
+
+        Returns:
+            bool: whether some branch placed the shape, the search is over otherwise
+        """
+
+        if not self._live:
+            return False
+        shape = [list(corner) for corner in shape]
+        area = polygon_area(shape)
+
+        # every worker extends every n-th branch, the greedy one and the best ones first
+        n = len(self._executors)
+        keep = [branch.id for branch in self._live]
+        futures = [executor.submit(_extend, self._key, self._steps, keep, shape, keep[i::n], self._width, budget)
+                   for i, executor in enumerate(self._executors)]
+        found = {}
+        for future in futures:
+            found.update(future.result())
+        self._dropped = len(found) < len(keep)
+
+        children, greedy = [], None
+        for branch in self._live:
+            if branch.id not in found:
+                # not extended in time
+                continue
+            if not found[branch.id]:
+                self._finished.append(branch)
+                continue
+            for i, (x, y, rotation, top, gap) in enumerate(found[branch.id]):
+                child = Branch(None, ((x, y, rotation), branch.placements), branch.count + 1, branch.area + area,
+                               max(branch.top, top), branch.waste + gap)
+                if branch is self._live[0] and i == 0:
+                    # lowest placement in the greedy branch
+                    greedy = (child, branch.id)
+                else:
+                    children.append((child, branch.id))
+
+        # stable sort keeps children of better parents and lower placements first among equals
+        children.sort(key=lambda c: self._rank(c[0]), reverse=True)
+        if greedy is not None:
+            children.insert(0, greedy)
+        self._live, self._steps = [], []
+        for child, parent in children[:self._width]:
+            child = child._replace(id=self._next)
+            self._next += 1
+            self._live.append(child)
+            self._steps.append((child.id, parent, shape, child.placements[0]))
+        self._depth += 1
+        return bool(self._live)
+
+
+    def agreed(self):
+        """Whether all live branches place the first pending shape the same way, true if there are none
+
+        Returns:
+            bool: whether committing the shape drops no live branch
+        """
+
+        return len({self._placement(branch) for branch in self._live}) <= 1
+
+
+    def commit(self):
+        """Decides the first pending shape as the branch that placed the most shapes, the best one of them,
+        placed it. Branches that placed it otherwise are dropped
+
+        Returns:
+            Tuple(int, int, int): position of the first point and rotation of the shape, None if no branch placed it
+        """
+
+        if not self._depth:
+            return None
+        best = max(self._finished + self._live, key=lambda b: (b.count, self._rank(b)))
+        placement = self._placement(best)
+        self._live = [b for b in self._live if self._placement(b) == placement]
+        self._finished = [b for b in self._finished if self._placement(b) == placement]
+        kept = {branch.id for branch in self._live}
+        self._steps = [step for step in self._steps if step[0] in kept]
+        self._base += 1
+        self._depth -= 1
+        return placement
+
+
+    def close(self):
+        """Drops the branches and shuts the workers down"""
+
+        for executor in self._executors:
+            executor.submit(_drop, self._key).result()
+            executor.shutdown()
+
+
+    def _placement(self, branch : Branch):
+        """Placement of the first pending shape in a branch
+
+        Args:
+            branch (Branch): branch
+
+        Returns:
+            Tuple(int, int, int): position of the first point and rotation of the shape, None if the branch did not place it
+        """
+
+        if branch.count <= self._base:
+            return None
+        node = branch.placements
+        for _ in range(branch.count - 1 - self._base):
+            node = node[1]
+        return node[0]
+
+
+    def _rank(self, branch : Branch):
+        """Rank of a branch, less free area left under placed shapes first, then higher density, i.e. filled area
+        over the area of the circle under the top of the layout
+
+        Args:
+            branch (Branch): branch
+
+        Returns:
+            Tuple(float, float): larger is better
+        """
+
+        r = self._radius
+        top = min(max(branch.top, -r), r)
+        # area of the cap of the circle above the top
+        cap = r * r * math.acos(top / r) - top * math.sqrt(r * r - top * top)
+        under = math.pi * r * r - cap
+        return (-branch.waste, branch.area / under if under > 0 else math.inf)
+
+
+def _create(key : str, settings : dict, shapes : List):
+    """Creates the first branch holding already placed shapes, runs in a worker process"""
+
+    from myplacer import MyPlacer
+
+    placer = MyPlacer.mirror(settings)
+    for shape in shapes:
+        placer._sg._shapes.append(shape)
+        placer._sg._index.insert(Polygon(shape))
+    placer._cache_placed_shapes()
+    _BRANCHES[key, 0] = placer
+
+
+def _extend(key : str, steps : List, keep : List, shape : List, branches : List, count : int, budget : float = None):
+    """Makes children created by the previous step, drops their parents and finds the lowest placements
+    of a shape in branches, runs in a worker process
+
+    Returns:
+        dict: up to count placements of the shape for every extended branch, as position of the first point,
+            rotation, the height of the highest point and the free area left under the shape
+    """
+
+    start = perf_counter()
+    children = {}
+    for branch, parent, previous, placement in steps:
+        children.setdefault(parent, []).append((branch, previous, placement))
+    for parent, made in children.items():
+        # parents are dropped, the first child takes over its parent, the others fork it before it changes
+        placers = [_BRANCHES[key, parent]]
+        placers += [placers[0].fork() for _ in made[1:]]
+        for placer, (branch, previous, placement) in zip(placers, made):
+            placer._sg.accept_shape(previous)
+            placer._cut = False
+            placer._commit(placement)
+            _BRANCHES[key, branch] = placer
+    keep = set(keep)
+    for k in [k for k in _BRANCHES if k[0] == key and k[1] not in keep]:
+        del _BRANCHES[k]
+
+    found, longest = {}, 0
+    for i, branch in enumerate(branches):
+        if i and budget is not None and perf_counter() - start + longest > budget:
+            break
+        began = perf_counter()
+        found[branch] = _BRANCHES[key, branch]._candidates(shape, count)
+        longest = max(longest, perf_counter() - began)
+    return found
+
+
+def _drop(key : str):
+    """Drops branches of a search, runs in a worker process"""
+
+    for k in [k for k in _BRANCHES if k[0] == key]:
+        del _BRANCHES[k]
@@ -0,0 +1,254 @@
+"""Benchmark of the placer over a grid of generators.
+
+Every case runs in its own process, one after another, so that timings are not disturbed
+by other cases and the random generator is seeded the same way as in run.py.
+
+    python benchmark.py run --out results.json
+    python benchmark.py run --symmetry none sixfold --radius 5 10 20 --family random --out results.json
+    python benchmark.py compare results.json baseline.json --threshold 1.2
+    python benchmark.py startup
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import platform
+import subprocess
+import sys
+
+import numpy as np
+
+from mocker import RandomShapeGenerator, SquareShapeGenerator, Symmetry
+
+
+# time limit of a single shape
+BUDGET = 1.0
+
+# compared timings, larger is worse, the maximum is a single sample and is checked against the budget only
+TIMINGS = ('time', 'p50', 'p95')
+
+
+def generator(family : str, symmetry : str, seed : int, radius : float):
+    """Shape generator of a benchmark case
+
+    Args:
+        family (str): 'random' or 'square'
+        symmetry (str): name of a Symmetry
+        seed (int): seed of the random shapes
+        radius (float): radius of the circle
+
+    Returns:
+        ShapeGenerator: generator of the case
+    """
+
+    if family == 'random':
+        return RandomShapeGenerator(radius=radius, rotations=Symmetry[symmetry], fixed_seed=seed)
+    if family == 'square':
+        return SquareShapeGenerator(radius, Symmetry[symmetry])
+    raise ValueError(f"Unknown shape family {family}, expected 'random' or 'square'")
+
+
+def run_case(case : dict):
+    """Fills the circle of a case and measures the placer, meant to run in a fresh process
+
+    Args:
+        case (dict): family, symmetry, seed, radius and search mode
+
+    Returns:
+        dict: the case with its fill ratio, per-shape latencies, throughput and peak memory
+    """
+
+    from myplacer import MyPlacer
+    from stats import PlacementStats
+
+    stats = PlacementStats()
+    placer = MyPlacer(generator(case['family'], case['symmetry'], case['seed'], case['radius']),
+                      search=case['search'], stats=stats)
+    sg = placer.run()
+
+    times = np.array([r['time'] for r in stats.shapes])
+    total = float(times.sum())
+    # mean latency in every tenth of the run, shows how it grows with placed shapes
+    curve = [float(part.mean()) for part in np.array_split(times, min(10, len(times))) if len(part)]
+
+    return dict(case,
+                shapes=sg.placed_shapes,
+                fill=sg.filled_area,
+                time=total,
+                throughput=sg.placed_shapes / total if total > 0 else 0.0,
+                p50=float(np.percentile(times, 50)),
+                p95=float(np.percentile(times, 95)),
+                max=float(times.max()),
+                over_budget=int((times > BUDGET).sum()),
+                curve=curve,
+                peak_rss_mb=peak_rss_mb())
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process
+
+    Returns:
+        float: megabytes, None where the resource module is not available
+    """
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def cases(families : list, symmetries : list, seeds : list, radii : list, search : list):
+    """All combinations of the swept parameters
+
+    Returns:
+        List(dict): benchmark cases
+    """
+
+    return [{'family': f, 'symmetry': sym, 'seed': seed, 'radius': r, 'search': mode}
+            for f in families for sym in symmetries for r in radii for mode in search
+            # square shapes are not random, every seed gives the same case
+            for seed in (seeds if f == 'random' else seeds[:1])]
+
+
+def run(args):
+    """Runs all cases one by one, each in its own process, and writes the results file"""
+
+    results = []
+    for case in cases(args.family, args.symmetry, args.seed, args.radius, args.search):
+        with ProcessPoolExecutor(1) as executor:
+            result = executor.submit(run_case, case).result()
+        results.append(result)
+        print(f"{key(result)}: {result['shapes']} shapes, fill {result['fill']:.4f}, "
+              f"p50 {result['p50']*1000:.1f} ms, p95 {result['p95']*1000:.1f} ms, max {result['max']*1000:.1f} ms, "
+              f"{result['throughput']:.1f} shapes/s", flush=True)
+
+    with open(args.out, 'w') as f:
+        json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'budget': BUDGET,
+                   'cases': results}, f, indent=1)
+    print(f"Results written to {args.out}")
+
+
+def key(case : dict):
+    """Name identifying a case in two results files
+
+    Returns:
+        str: family, symmetry, seed, radius and search mode
+    """
+
+    return f"{case['family']}/{case['symmetry']}/seed={case['seed']}/r={case['radius']}/{case['search']}"
+
+
+def compare(args):
+    """Compares a results file with a baseline, flags slowdowns over the threshold and lower fill ratios
+
+    Returns:
+        int: 1 if some case regressed, 0 otherwise
+    """
+
+    with open(args.results) as f:
+        current = {key(c): c for c in json.load(f)['cases']}
+    with open(args.baseline) as f:
+        baseline = {key(c): c for c in json.load(f)['cases']}
+
+    regressed = False
+    for name, case in current.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name}: not in baseline")
+            continue
+
+        flags = []
+        for metric in TIMINGS:
+            # timings under the noise floor are not compared
+            if base[metric] >= args.min_time and case[metric] > base[metric] * args.threshold:
+                flags.append(f"{metric} {base[metric]*1000:.1f} -> {case[metric]*1000:.1f} ms")
+        if case['fill'] < base['fill'] - args.fill_tolerance:
+            flags.append(f"fill {base['fill']:.4f} -> {case['fill']:.4f}")
+        if case['over_budget'] > base['over_budget']:
+            flags.append(f"shapes over budget {base['over_budget']} -> {case['over_budget']}")
+
+        if flags:
+            regressed = True
+            print(f"{name}: REGRESSION " + ', '.join(flags))
+        else:
+            print(f"{name}: ok, time {base['time']:.2f} -> {case['time']:.2f} s")
+
+    return 1 if regressed else 0
+
+
+def import_time(module : str, repeat : int):
+    """Time of importing a module in fresh interpreters
+
+    Args:
+        module (str): name of the module
+        repeat (int): number of interpreters
+
+    Returns:
+        float: median import time in seconds
+        bool: whether matplotlib was imported with the module
+    """
+
+    code = (f"import sys, time; start = time.perf_counter(); import {module}; "
+            f"print(time.perf_counter() - start, 'matplotlib' in sys.modules)")
+    times, plotting = [], False
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split()
+        times.append(float(out[0]))
+        plotting |= out[1] == 'True'
+    return float(np.median(times)), plotting
+
+
+def startup(args):
+    """Checks that importing the placer costs about as much as importing shapely alone and does not load matplotlib
+
+    Returns:
+        int: 1 if the import is too slow or loads matplotlib, 0 otherwise
+    """
+
+    base, _ = import_time('shapely', args.repeat)
+    failed = False
+    for module in args.module:
+        seconds, plotting = import_time(module, args.repeat)
+        slow = seconds > base * args.threshold
+        print(f"import {module}: {seconds*1000:.1f} ms, shapely alone {base*1000:.1f} ms"
+              + (', matplotlib imported' if plotting else '') + (', TOO SLOW' if slow else ''))
+        failed |= slow or plotting
+    return 1 if failed else 0
+
+
+def main(argv : list = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    sweep = commands.add_parser('run', help='run the benchmark cases and write a results file')
+    sweep.add_argument('--family', nargs='+', default=['random', 'square'], choices=['random', 'square'])
+    sweep.add_argument('--symmetry', nargs='+', default=[s.name for s in Symmetry], choices=[s.name for s in Symmetry])
+    sweep.add_argument('--seed', nargs='+', type=int, default=[111])
+    sweep.add_argument('--radius', nargs='+', type=float, default=[5, 10])
+    sweep.add_argument('--search', nargs='+', default=['union'], choices=['union', 'heap'])
+    sweep.add_argument('--out', default='benchmark.json', help='results file')
+    sweep.set_defaults(func=run)
+
+    check = commands.add_parser('compare', help='flag regressions of a results file against a baseline')
+    check.add_argument('results')
+    check.add_argument('baseline')
+    check.add_argument('--threshold', type=float, default=1.2, help='allowed ratio of timings to the baseline')
+    check.add_argument('--min-time', type=float, default=0.005, help='baseline timings under this many seconds are not compared')
+    check.add_argument('--fill-tolerance', type=float, default=0.0, help='allowed decrease of the fill ratio')
+    check.set_defaults(func=compare)
+
+    imports = commands.add_parser('startup', help='check import time of the placer against shapely alone')
+    imports.add_argument('--module', nargs='+', default=['myplacer', 'parallel'])
+    imports.add_argument('--repeat', type=int, default=5, help='number of fresh interpreters to take the median of')
+    imports.add_argument('--threshold', type=float, default=1.5, help='allowed ratio of the import time to shapely alone')
+    imports.set_defaults(func=startup)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,47 @@
+import os
+import pickle
+import tempfile
+
+
+# version of the checkpoint layout, checkpoints of other versions are refused
+VERSION = 5
+
+
+def save(path : str, state : dict):
+    """Writes a checkpoint atomically: the state is pickled to a temporary file in the same directory,
+    synced to disk and renamed over the previous checkpoint, so a crash leaves either the old or the new one
+
+    Args:
+        path (str): path of the checkpoint
+        state (dict): picklable state
+    """
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(path), suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump({'version': VERSION, 'state': state}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def load(path : str):
+    """Reads a checkpoint
+
+    Args:
+        path (str): path of the checkpoint
+
+    Returns:
+        dict: the saved state
+    """
+
+    with open(path, 'rb') as f:
+        checkpoint = pickle.load(f)
+    if checkpoint.get('version') != VERSION:
+        raise ValueError(f"Unsupported checkpoint version {checkpoint.get('version')}")
+    return checkpoint['state']
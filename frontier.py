@@ -0,0 +1,174 @@
+from copy import copy
+
+import numpy as np
+import shapely
+from shapely.geometry import Point, Polygon
+from math import cos, pi
+
+
+class Frontier(object):
+    """Tracks which placed shapes can still be touched by a new shape.
+
+    Free space of the circle is kept as a list of pockets(connected components of the
+    circle minus all placed shapes), each with the set of placed shapes adjacent to it.
+    A new shape lies in a single pocket, so it can only touch shapes adjacent to a pocket
+    that is at least as large as the shape and whose largest inscribed circle is at least
+    as large as the shape's. Other shapes are enclosed by placed shapes and the circle
+    and do not have to be part of the NFP.
+
+    Forks share the shapes and the pockets, see fork().
+    """
+
+    def __init__(self, radius : float, tolerance : float = 1e-6, segments : int = 256, circle_tolerance : float = 1e-3):
+        """Constructor
+
+        Args:
+            radius (float): radius of the circle
+            tolerance (float, optional): distance under which a shape is considered adjacent to a pocket. Defaults to 1e-6.
+            segments (int, optional): number of segments approximating the circle. Defaults to 256.
+            circle_tolerance (float, optional): precision of largest inscribed circles. Defaults to 1e-3.
+        """
+
+        self._tolerance = tolerance
+        self._circle_tolerance = circle_tolerance
+        self._shapes = []
+        # shapes of this frontier and number of shapes in the list, shared by forks
+        self._count = 0
+        self._tip = [0]
+
+        # circumscribed polygon, so that the pocket along the edge of the circle is never too small
+        circle = Point(0, 0).buffer(radius / cos(pi / segments), quad_segs=segments // 4)
+        self._pockets = [circle]
+        self._areas = [circle.area]
+        self._radii = [self._inscribed_radius(circle)]
+        self._adjacent = [set()]
+
+
+    def __len__(self):
+        return self._count
+
+
+    @property
+    def shapes(self):
+        """Placed shapes as polygons
+
+        Returns:
+            List(Polygon): placed shapes in the order they were added
+        """
+
+        return self._shapes[:self._count]
+
+
+    def fork(self):
+        """Copy sharing the shapes and the pockets, in O(1). The list of shapes is appended in place
+        by the frontier whose count is its length, the others copy it first. Lists of pockets are
+        replaced rather than changed when a shape is added, so forks never see each other's shapes
+
+        Returns:
+            Frontier: frontier with the same placed shapes
+        """
+
+        return copy(self)
+
+
+    def add(self, shape):
+        """Adds a placed shape, splits the pockets it lies in and updates their adjacent shapes
+
+        Args:
+            shape (List(List(int, int))): vertices of a placed shape
+        """
+
+        polygon = Polygon(shape)
+        index = self._count
+        if self._tip[0] != index:
+            # a fork added shapes after this frontier, they are kept
+            self._shapes = self._shapes[:index]
+            self._tip = [index]
+        self._shapes.append(polygon)
+        self._count += 1
+        self._tip[0] = self._count
+
+        hit = shapely.intersects(np.array(self._pockets, dtype=object), polygon).nonzero()[0]
+        # lists of pockets may be shared with forks, new ones are built without the hit pockets
+        split = [(self._pockets[i], self._adjacent[i]) for i in hit[::-1]]
+        kept = np.ones(len(self._pockets), dtype=bool)
+        kept[hit] = False
+        kept = np.flatnonzero(kept).tolist()
+        self._pockets = [self._pockets[i] for i in kept]
+        self._areas = [self._areas[i] for i in kept]
+        self._radii = [self._radii[i] for i in kept]
+        self._adjacent = [self._adjacent[i] for i in kept]
+        for pocket, adjacent in split:
+
+            candidates = np.array(sorted(adjacent | {index}))
+            shapes = np.array([self._shapes[j] for j in candidates], dtype=object)
+            for piece in shapely.get_parts(pocket.difference(polygon)):
+                if not isinstance(piece, Polygon) or piece.area <= 0:
+                    continue
+                near = shapely.dwithin(shapes, piece, self._tolerance)
+                self._pockets.append(piece)
+                self._areas.append(piece.area)
+                self._radii.append(self._inscribed_radius(piece))
+                self._adjacent.append(set(candidates[near].tolist()))
+
+
+    def active(self, polygon : Polygon):
+        """Placed shapes that a new shape can touch
+
+        Args:
+            polygon (Polygon): new shape
+
+        Returns:
+            np.ndarray: sorted indices of active shapes
+        """
+
+        return np.flatnonzero(self._mask(polygon))
+
+
+    def retired(self, polygon : Polygon):
+        """Placed shapes that a new shape cannot touch
+
+        Args:
+            polygon (Polygon): new shape
+
+        Returns:
+            np.ndarray: sorted indices of retired shapes
+        """
+
+        return np.flatnonzero(~self._mask(polygon))
+
+
+    def _mask(self, polygon : Polygon):
+        """Marks placed shapes adjacent to a pocket the new shape can fit in
+
+        Args:
+            polygon (Polygon): new shape
+
+        Returns:
+            np.ndarray: boolean array, True for active shapes
+        """
+
+        area = polygon.area * (1 - 1e-9)
+        # computed radius is never larger than the true one, pocket radii are extended by the tolerance
+        radius = shapely.maximum_inscribed_circle(polygon, self._circle_tolerance).length
+
+        mask = np.zeros(self._count, dtype=bool)
+        for pocket_area, pocket_radius, adjacent in zip(self._areas, self._radii, self._adjacent):
+            if pocket_area >= area and pocket_radius >= radius:
+                mask[list(adjacent)] = True
+        return mask
+
+
+    def _inscribed_radius(self, pocket : Polygon):
+        """Upper bound of the radius of the largest circle inside a pocket
+
+        Args:
+            pocket (Polygon): pocket of free space
+
+        Returns:
+            float: radius of the largest inscribed circle
+        """
+
+        # large pockets are never close to the size of a shape, coarse precision is enough for them
+        tolerance = max(self._circle_tolerance, 0.01 * pocket.area ** 0.5)
+        return shapely.maximum_inscribed_circle(pocket, tolerance).length + tolerance
@@ -0,0 +1,95 @@
+from collections import OrderedDict
+
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+
+
+class IFPEngine(object):
+    """Inner-fit polygons(IFP) of convex shapes in a circle.
+
+    A shape placed by its reference point p lies inside a circle of radius R centered in (0,0)
+    if |p + v| <= R for every vertex offset v of the shape, so the IFP is the intersection of
+    circles of radius R centered at -v. The boundary of the intersection is sampled
+    at fixed angles and in the crossings of the circles, its convex hull is then inscribed
+    in the exact IFP. IFPs are memoized by the vertex offsets of the shape, i.e. by the shape
+    and its rotation.
+    """
+
+    def __init__(self, radius : float, segments : int = 256, cache_size : int = 1024, margin : float = 1e-9):
+        """Constructor
+
+        Args:
+            radius (float): radius of the circle
+            segments (int, optional): number of arc samples of a full circle. Defaults to 256.
+            cache_size (int, optional): number of memoized IFPs. Defaults to 1024.
+            margin (float, optional): distance kept from the edge of the circle to absorb rounding errors. Defaults to 1e-9.
+        """
+
+        self._radius = radius - margin
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+
+        angles = np.linspace(0, 2*np.pi, segments, endpoint=False)
+        self._unit = np.stack((np.cos(angles), np.sin(angles)), axis=1)
+
+
+    def inner_fit(self, polygon : Polygon, reference : tuple):
+        """IFP of a shape placed by its reference point
+
+        Args:
+            polygon (Polygon): shape
+            reference (Tuple(int, int)): point of the shape the IFP is constructed for
+
+        Returns:
+            Polygon: IFP, empty if the shape does not fit into the circle
+        """
+
+        offsets = np.asarray(polygon.convex_hull.exterior.coords)[:-1] - reference
+        key = tuple(np.round(offsets, 12).ravel())
+
+        ifp = self._cache.get(key)
+        if ifp is not None:
+            self._cache.move_to_end(key)
+            return ifp
+
+        ifp = self._construct(-offsets)
+        self._cache[key] = ifp
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return ifp
+
+
+    def _construct(self, centers : np.ndarray):
+        """Convex polygon inscribed in the intersection of circles
+
+        Args:
+            centers (np.ndarray): (k, 2) centers of the circles
+
+        Returns:
+            Polygon: IFP
+        """
+
+        r = self._radius
+
+        # samples of every circle
+        points = (centers[:, None, :] + r * self._unit[None]).reshape(-1, 2)
+
+        # crossings of every pair of circles
+        i, j = np.triu_indices(len(centers), 1)
+        chord = centers[j] - centers[i]
+        half = np.hypot(chord[:, 0], chord[:, 1]) / 2
+        valid = (half > 0) & (half <= r)
+        chord, half, middle = chord[valid], half[valid], (centers[i][valid] + centers[j][valid]) / 2
+        normal = np.stack((-chord[:, 1], chord[:, 0]), axis=1) / (2 * half[:, None])
+        height = np.sqrt(r**2 - half**2)[:, None]
+        points = np.concatenate((points, middle + height * normal, middle - height * normal))
+
+        # keep points inside all circles
+        distances = np.hypot(points[:, None, 0] - centers[None, :, 0], points[:, None, 1] - centers[None, :, 1])
+        points = points[(distances <= r * (1 + 1e-12)).all(axis=1)]
+
+        hull = shapely.multipoints(points).convex_hull
+        if not isinstance(hull, Polygon):
+            return Polygon()
+        return hull
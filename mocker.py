@@ -1,10 +1,13 @@
 from enum import IntEnum
-import matplotlib.pyplot as plt
+from copy import copy
 
-from random import random, seed
-from math import sin, cos, radians, sqrt, pi
+from random import Random
+from time import perf_counter
+from math import sin, cos, radians, sqrt, pi, floor
 from typing import Optional
 from shapely.geometry import Polygon
+import shapely
+import numpy as np
 
 
 def polygon_area(corners):
@@ -33,6 +36,178 @@ class Symmetry(IntEnum):
     sixfold = 60
 
 
+class ShapeIndex(object):
+    """Uniform grid over bounding boxes of placed shapes, used to find shapes that can overlap.
+
+    Cells hold (index, polygon) entries. Forks share the list of polygons and the cells, see fork().
+    """
+
+    def __init__(self, cell_size: float = 2.0):
+        self._cell_size = cell_size
+        self._cells = {}
+        self._polygons = []
+        self._count = 0
+        self._tip = [0]
+
+    def __len__(self):
+        return self._count
+
+    def fork(self):
+        """Copy sharing the list and the cells, in O(1).
+
+        The index whose count is the length of the list appends to it and to the cells in place, the others
+        copy the list and the dictionary of cells(not the entries) first. Entries of other forks are ignored,
+        an entry is own if its polygon is the polygon of its index in the list.
+        """
+        return copy(self)
+
+    def insert(self, polygon: Polygon):
+        """Add a placed shape to the index."""
+        index = self._count
+        if self._tip[0] != index:
+            # a fork inserted after this index, its entries stay in the cells
+            self._polygons = self._polygons[:index]
+            self._cells = dict(self._cells)
+            self._tip = [index]
+        self._polygons.append(polygon)
+        for cell in self._cells_of(polygon.bounds):
+            self._cells[cell] = self._cells.get(cell, ()) + ((index, polygon),)
+        self._count += 1
+        self._tip[0] = self._count
+
+    def truncate(self, count: int):
+        """Drop shapes past count."""
+        self._count = min(count, self._count)
+
+    def query(self, polygon: Polygon):
+        """Return placed shapes whose bounding boxes intersect bounding box of given shape, in order of placement."""
+        minx, miny, maxx, maxy = polygon.bounds
+        found = set()
+        for cell in self._cells_of(polygon.bounds):
+            for index, placed in self._cells.get(cell, ()):
+                if index < self._count and self._polygons[index] is placed:
+                    found.add(index)
+        candidates = []
+        for index in sorted(found):
+            x0, y0, x1, y1 = self._polygons[index].bounds
+            if x0 <= maxx and minx <= x1 and y0 <= maxy and miny <= y1:
+                candidates.append(self._polygons[index])
+        return candidates
+
+    def _cells_of(self, bounds):
+        minx, miny, maxx, maxy = bounds
+        for i in range(floor(minx / self._cell_size), floor(maxx / self._cell_size) + 1):
+            for j in range(floor(miny / self._cell_size), floor(maxy / self._cell_size) + 1):
+                yield i, j
+
+
+class ShapeStore(object):
+    """Placed shapes in a growable (N, k, 2) array with their rotations and a running total of their areas.
+
+    Shapes with fewer than k vertices are padded by repeating their last vertex. Indexing, slicing
+    and iterating return shapes as lists of [x, y] lists, array and vertices() return views of the array.
+    Forks share the arrays, see fork().
+    """
+
+    def __init__(self, capacity: int = 64):
+        self._vertices = np.zeros((capacity, 0, 2))
+        self._sizes = np.zeros(capacity, dtype=int)
+        self._rotations = np.zeros(capacity, dtype=int)
+        self._count = 0
+        self._area = 0.0
+        # number of rows written to the arrays, shared by forks
+        self._tip = [0]
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._shape(i) for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("shape index out of range")
+        return self._shape(index)
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self._shape(i)
+
+    @property
+    def array(self):
+        """Vertices of all shapes, (N, k, 2) view."""
+        return self._vertices[:self._count]
+
+    @property
+    def rotations(self):
+        """Rotations of all shapes in degrees, (N,) view."""
+        return self._rotations[:self._count]
+
+    @property
+    def area(self):
+        """Total area of all shapes."""
+        return self._area
+
+    def vertices(self, index: int):
+        """Vertices of a single shape, view without padding."""
+        return self._vertices[index, :self._sizes[index]]
+
+    def fork(self):
+        """Copy sharing the arrays, in O(1).
+
+        Rows below the count of a store never change. The store whose count is the number of written
+        rows appends in place, the others copy the arrays before they append, so forks never see
+        each other's shapes.
+        """
+        return copy(self)
+
+    def append(self, shape, rotation: int = 0):
+        """Add a shape given by its vertices and the rotation it was placed with."""
+        n = len(shape)
+        if self._tip[0] != self._count:
+            # a fork appended after this store, its rows are kept
+            self._grow(len(self._vertices), self._vertices.shape[1])
+        if self._count == len(self._vertices):
+            self._grow(2 * len(self._vertices), self._vertices.shape[1])
+        if n > self._vertices.shape[1]:
+            self._grow(len(self._vertices), n)
+
+        self._vertices[self._count, :n] = shape
+        self._vertices[self._count, n:] = self._vertices[self._count, n - 1]
+        self._sizes[self._count] = n
+        self._rotations[self._count] = rotation
+        self._area += polygon_area(shape)
+        self._count += 1
+        self._tip[0] = self._count
+
+    def extend(self, shapes):
+        for shape in shapes:
+            self.append(shape)
+
+    def truncate(self, count: int):
+        """Drop shapes past count, the arrays are copied on the next append."""
+        for i in range(count, self._count):
+            self._area -= polygon_area(self._shape(i))
+        self._count = min(count, self._count)
+
+    def _shape(self, index):
+        return self._vertices[index, :self._sizes[index]].tolist()
+
+    def _grow(self, capacity, k):
+        vertices = np.zeros((capacity, k, 2))
+        sizes = np.zeros(capacity, dtype=int)
+        rotations = np.zeros(capacity, dtype=int)
+        old = self._vertices.shape[1]
+        vertices[:self._count, :old] = self._vertices[:self._count]
+        if old:
+            vertices[:self._count, old:] = self._vertices[:self._count, old - 1:old]
+        sizes[:self._count] = self._sizes[:self._count]
+        rotations[:self._count] = self._rotations[:self._count]
+        self._vertices, self._sizes, self._rotations = vertices, sizes, rotations
+        self._tip = [self._count]
+
+
 class ShapeGenerator(object):
 
     def __init__(self, radius: float, rotations: Symmetry):
@@ -40,7 +215,27 @@ class ShapeGenerator(object):
         self._rotations = rotations
         self._shape = None
         self._ready = True
-        self._shapes = []
+        self._shapes = ShapeStore()
+        self._index = ShapeIndex()
+        self._trace = None
+        self._generated = 0
+
+    def __getstate__(self):
+        # an open trace is not part of the state, recording is not resumed
+        state = self.__dict__.copy()
+        state['_trace'] = None
+        return state
+
+    def fork(self):
+        """Copy whose placed shapes are shared until either of them places one, in O(1).
+
+        The copy keeps the current shape, it does not record.
+        """
+        fork = copy(self)
+        fork._shapes = self._shapes.fork()
+        fork._index = self._index.fork()
+        fork._trace = None
+        return fork
 
     @property
     def current_shape(self):
@@ -49,12 +244,31 @@ class ShapeGenerator(object):
     def new_shape(self):
         """Generate new shape and return it."""
         if self._ready:
-            self._ready = False
-            self._shape = self._get_shape()
-            return self._shape
+            return self.accept_shape(self._get_shape())
         else:
             raise NotAllowedError("Shape generator is not ready, submit previous shape position")
 
+    def accept_shape(self, shape):
+        """Take a shape from an outside source as the new shape and return it."""
+        if not self._ready:
+            raise NotAllowedError("Shape generator is not ready, submit previous shape position")
+        if self._trace is not None:
+            # rejected before the generator changes
+            self._trace.check(shape)
+        self._ready = False
+        self._shape = [list(corner) for corner in shape]
+        self._generated = perf_counter()
+        return self._shape
+
+    def skip_shape(self):
+        """Drop the current shape without placing it."""
+        if self._shape is None:
+            raise NotAllowedError("There is no shape to skip, get a new shape first")
+        if self._trace is not None:
+            self._trace.write(self._shape, perf_counter() - self._generated, placed=False)
+        self._shape = None
+        self._ready = True
+
     def place_shape(self, x: float, y: float, rotation: int):
         """Place shape to have its position at given coordinates.
 
@@ -63,6 +277,7 @@ class ShapeGenerator(object):
         """
         if self._shape is None:
             raise NotAllowedError("There is no shape to place, get a new shape first")
+        position = (x, y)
 
         s = self._rotate_shape(self._shape, rotation)
         s = self._translate_shape(s, x, y)
@@ -73,31 +288,62 @@ class ShapeGenerator(object):
             if distance > self._radius:
                 raise NotAllowedError(f"You can't place a shape outside of the circle of radius {self._radius}!")
 
-        # check collisions using shapely library
+        # check collisions using shapely library, only with shapes whose bounding boxes intersect
         current_shape = Polygon(s)
-        other_shapes = [Polygon(x) for x in self._shapes]
-        for x in other_shapes:
-            if current_shape.intersection(x).area > 0.0000001:
+        shapely.prepare(current_shape)
+        for x in self._index.query(current_shape):
+            if current_shape.intersects(x) and current_shape.intersection(x).area > 0.0000001:
                 print(current_shape.intersection(x).area, len(self._shapes))
                 raise NotAllowedError(f"You can't place a shape so it overlaps with other shape!")
 
-        self._shapes.append(s)
+        self._shapes.append(s, rotation)
+        self._index.insert(current_shape)
+        if self._trace is not None:
+            self._trace.write(self._shape, perf_counter() - self._generated, *position, rotation)
         self._shape = None
         self._ready = True
 
-    def show_results(self):
-        f = plt.figure()
-        # add circle
-        ax = f.gca()
-        ax.set_aspect(1)
-        circle = plt.Circle((0, 0), self._radius, color='#aaa')
-        ax.add_patch(circle)
-        # add shapes
-        for s in self._shapes:
-            s = s + [s[0]]    # in order to close the loop
-            xs, ys = zip(*s)  # zip to x and y
-            plt.plot(xs, ys)
-        plt.show()
+    def rollback(self, count: int):
+        """Drop placed shapes past count and the current shape, used when placing fails part way."""
+        self._shapes.truncate(count)
+        self._index.truncate(count)
+        self._shape = None
+        self._ready = True
+
+    def record(self, path: str, k: int = 4):
+        """Append generated shapes, their placements and times to a binary trace, see replay.py.
+
+        k is the largest number of vertices of a recorded shape, larger shapes are rejected when they are taken.
+        """
+        from replay import TraceWriter
+        trace = TraceWriter(path, self._radius, self._rotations, k)
+        if self._shape is not None:
+            # the current shape is recorded once it is placed or skipped
+            try:
+                trace.check(self._shape)
+            except ValueError:
+                trace.close()
+                raise
+        self._trace = trace
+
+    def stop_recording(self):
+        """Record the shape that was not placed, if any, and close the trace."""
+        if self._trace is None:
+            return
+        if self._shape is not None:
+            self._trace.write(self._shape, perf_counter() - self._generated, placed=False)
+        self._trace.close()
+        self._trace = None
+
+    def show_results(self, color_by: Optional[str] = None):
+        """Show placed shapes in a window, colored by 'order' or 'rotation' if given."""
+        from plotting import show_layout  # matplotlib is imported only when plotting
+        show_layout(self._radius, self._shapes, color_by)
+
+    def save_results(self, path: str, color_by: Optional[str] = None):
+        """Render placed shapes to an image file without a window, format given by its extension (png, svg, ...)."""
+        from plotting import render_layout
+        render_layout(self._radius, self._shapes, path, color_by)
 
     def print_results(self):
         print(f"Number of shapes: {len(self._shapes)}")
@@ -105,7 +351,7 @@ class ShapeGenerator(object):
 
     @property
     def filled_area(self):
-        area = sum([polygon_area(x) for x in self._shapes])  # total area of shapes
+        area = self._shapes.area  # total area of shapes, summed as they are placed
         ratio = area / (pi * self._radius * self._radius)
         # return value between 0 - 1
         return ratio
@@ -156,6 +402,7 @@ class ShapeGenerator(object):
 
 class RandomShapeGenerator(ShapeGenerator):
     def _get_shape(self):
+        random = self._random.random
         a = []
         a.append([ random(), random()])
         a.append([-random(), random()])
@@ -164,13 +411,16 @@ class RandomShapeGenerator(ShapeGenerator):
         return a
 
     def __init__(self, radius: float, rotations: Symmetry, fixed_seed: int = None):
-        if fixed_seed is not None:
-            seed(fixed_seed)
-        self._radius = radius
-        self._rotations = rotations
-        self._shape = None
-        self._ready = True
-        self._shapes = []
+        # own generator, so that generators sharing a process do not change each other's shapes
+        self._random = Random(fixed_seed)
+        super().__init__(radius, rotations)
+
+    def fork(self):
+        fork = super().fork()
+        # the fork continues the same sequence of shapes on its own
+        fork._random = Random()
+        fork._random.setstate(self._random.getstate())
+        return fork
 
 
 class SquareShapeGenerator(ShapeGenerator):
@@ -0,0 +1,203 @@
+from collections import namedtuple
+from typing import Iterable
+from time import perf_counter
+import uuid
+
+from parallel import InlineExecutor
+
+
+# wafers held by this process, by key of their placer and index
+_WAFERS = {}
+
+# decision about a single shape, wafer, position and rotation are None if no wafer could take it
+WaferPlacement = namedtuple('WaferPlacement', ['index', 'shape', 'wafer', 'x', 'y', 'rotation', 'placed', 'time'])
+
+
+class MultiWaferPlacer(object):
+    """Fills several circles(wafers) from one stream of shapes.
+
+    Every shape is evaluated on all wafers that are not full and goes to the one where it would
+    reach the lowest, so a shape one wafer rejects is placed on another. A wafer is full after it
+    rejected a number of consecutive shapes. Wafers live in worker processes, each worker evaluates
+    its wafers in one task and the workers evaluate in parallel.
+    """
+
+    def __init__(self, radius : float, rotations : int, wafers : int, workers : int = 0, patience : int = 5, **options):
+        """Constructor
+
+        Args:
+            radius (float): radius of every wafer
+            rotations (int): angle of allowed rotations in degrees, 360 for none
+            wafers (int): number of wafers
+            workers (int, optional): number of worker processes, wafers are evaluated in this process if less than 2. Defaults to 0.
+            patience (int, optional): number of consecutive rejected shapes after which a wafer is full. Defaults to 5.
+            **options: options of MyPlacer of every wafer
+        """
+
+        self._key = uuid.uuid4().hex
+        self._wafers = wafers
+        self._patience = patience
+        self._rejected = [0] * wafers
+        self._active = list(range(wafers))
+
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            self._executors = [ProcessPoolExecutor(1) for _ in range(min(workers, wafers))]
+        else:
+            self._executors = [InlineExecutor()]
+        # wafers of every executor
+        self._groups = [list(range(i, wafers, len(self._executors))) for i in range(len(self._executors))]
+        for executor, group in zip(self._executors, self._groups):
+            executor.submit(_create, self._key, group, radius, rotations, options).result()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+    @property
+    def active(self):
+        """Wafers that are not full
+
+        Returns:
+            List(int): indices of the wafers
+        """
+
+        return list(self._active)
+
+
+    def stream(self, shapes : Iterable):
+        """Places shapes one by one on the wafer where they reach the lowest, until all wafers are full
+
+        Args:
+            shapes (Iterable): shapes given as lists of vertices, or a callable returning the next shape and None at the end
+
+        Yields:
+            WaferPlacement: index of the shape in the stream, the shape, the wafer, position of its first point,
+                rotation, whether it was placed and seconds taken
+        """
+
+        source = iter(shapes, None) if callable(shapes) else iter(shapes)
+        index = 0
+        # no shape is taken from the source once all wafers are full
+        while self._active:
+            shape = next(source, None)
+            if shape is None:
+                return
+            start = perf_counter()
+            shape = [list(corner) for corner in shape]
+
+            # evaluate wafers of all workers in parallel
+            futures = []
+            for executor, group in zip(self._executors, self._groups):
+                group = [w for w in group if w in self._active]
+                if group:
+                    futures.append(executor.submit(_evaluate, self._key, group, shape))
+            found = {}
+            for future in futures:
+                found.update(future.result())
+
+            # lowest top of the placed shape, then the lowest wafer index
+            feasible = [(top, w) for w, (placement, top) in found.items() if placement is not None]
+            chosen = min(feasible)[1] if feasible else None
+            for w, (placement, top) in found.items():
+                self._rejected[w] = 0 if placement is not None else self._rejected[w] + 1
+            self._active = [w for w in self._active if self._rejected[w] < self._patience]
+
+            if chosen is None:
+                yield WaferPlacement(index, shape, None, None, None, None, False, perf_counter() - start)
+                index += 1
+                continue
+
+            placement = found[chosen][0]
+            self._executors[chosen % len(self._executors)].submit(_commit, self._key, chosen, shape, placement).result()
+            x, y, rotation = placement
+            yield WaferPlacement(index, shape, chosen, float(x), float(y), int(rotation), True, perf_counter() - start)
+            index += 1
+
+
+    def results(self):
+        """Placed shapes of every wafer
+
+        Returns:
+            List(dict): placed shapes, their rotations and the filled area of every wafer
+        """
+
+        results = {}
+        for executor, group in zip(self._executors, self._groups):
+            results.update(executor.submit(_results, self._key, group).result())
+        return [results[w] for w in range(self._wafers)]
+
+
+    def close(self):
+        """Drops the wafers and shuts the workers down"""
+
+        for executor, group in zip(self._executors, self._groups):
+            executor.submit(_drop, self._key, group).result()
+            executor.shutdown()
+
+
+def _create(key : str, wafers : list, radius : float, rotations : int, options : dict):
+    """Creates placers of wafers, runs in a worker process"""
+
+    from myplacer import MyPlacer
+
+    for w in wafers:
+        _WAFERS[key, w] = MyPlacer.streaming(radius, rotations, **options)
+
+
+def _evaluate(key : str, wafers : list, shape : list):
+    """Lowest placement of a shape on wafers without placing it, runs in a worker process
+
+    Returns:
+        dict: placement and the top of the placed shape for every wafer, placement is None if it cannot be placed
+    """
+
+    found = {}
+    for w in wafers:
+        placer = _WAFERS[key, w]
+        poly = placer._sg.accept_shape(shape)
+        placer._started = perf_counter()
+        placer._cut = False
+        try:
+            placement = placer._decide(poly)
+        finally:
+            placer._sg.skip_shape()
+
+        top = None
+        if placement is not None:
+            placed = placer._sg._rotate_shape(shape, placement[2])
+            top = max(p[1] for p in placed) - placed[0][1] + placement[1]
+        found[w] = (placement, top)
+    return found
+
+
+def _commit(key : str, wafer : int, shape : list, placement : tuple):
+    """Places a shape on a wafer where it was evaluated, runs in a worker process"""
+
+    placer = _WAFERS[key, wafer]
+    placer._sg.accept_shape(shape)
+    placer._cut = False
+    placer._commit(placement)
+
+
+def _results(key : str, wafers : list):
+    """Placed shapes of wafers, runs in a worker process"""
+
+    results = {}
+    for w in wafers:
+        sg = _WAFERS[key, w]._sg
+        results[w] = {'shapes': list(sg._shapes), 'rotations': sg._shapes.rotations.tolist(), 'filled': float(sg.filled_area)}
+    return results
+
+
+def _drop(key : str, wafers : list):
+    """Drops placers of wafers, runs in a worker process"""
+
+    for w in wafers:
+        _WAFERS.pop((key, w), None)
@@ -1,27 +1,250 @@
-from mocker import ShapeGenerator
-from typing import List, Tuple
-from matplotlib.patches import Polygon
-from mocker import Placer, NotAllowedError
-import matplotlib.pyplot as plt
-
-from random import uniform
-from shapely.geometry import *
+from mocker import ShapeGenerator, Symmetry
+from typing import Iterable, Iterator, List, Tuple
+from collections import namedtuple
+from copy import copy
+from mocker import Placer
+
+from shapely.geometry import Polygon, MultiPolygon
 from shapely.ops import unary_union
 import math
+import numpy as np
+import shapely
+from time import perf_counter
+
+from nfp import NFPEngine, boundary_lines
+from frontier import Frontier
+from occupancy import OccupancyGrid
+from ifp import IFPEngine
+from parallel import OrientationPool, SKIPPED, prefetch
+from stats import PlacementStats, DISABLED
+from search import lowest_feasible_point
+from beam import BeamSearch
+from replay import TraceExhausted
+import checkpoint as checkpoints
+
+
+# decision of stream() about a single shape, position and rotation are None if it was not placed
+Placement = namedtuple('Placement', ['index', 'shape', 'x', 'y', 'rotation', 'placed', 'time'])
+
+# answer of query() about a single shape, position, rotation and top are None if it does not fit
+Candidate = namedtuple('Candidate', ['index', 'shape', 'x', 'y', 'rotation', 'fits', 'top'])
 
 
 class MyPlacer(Placer):
     
 
-    def __init__(self, sg : ShapeGenerator):
+    def __init__(self, sg : ShapeGenerator, ifp_segments : int = 256, workers : int = 0, search : str = 'union',
+                 deadline : float = None, stats : PlacementStats = None, frames = None,
+                 checkpoint : str = None, checkpoint_every : int = 100, grid : int = 256, nfp_cache : int = 256,
+                 nfp_tolerance : float = 1e-9, beam : int = 0, beam_depth : int = 8):
         """Constructor
 
         Args:
             sg (ShapeGenerator): ShapeGenerator object, refer to mocker documentation
+            ifp_segments (int, optional): number of segments of a full circle used to tessellate arcs of IFPs. Defaults to 256.
+            workers (int, optional): number of processes evaluating orientations of a shape in parallel,
+                orientations are evaluated in this process if less than 2. Defaults to 0.
+            search (str, optional): 'union' finds placements on the boundary of the union of NFPs,
+                'heap' visits vertices and crossings of NFPs from the lowest one without building the union. Defaults to 'union'.
+            deadline (float, optional): seconds available to find placements of orientations of a shape. Orientations
+                are evaluated from the one with the lowest IFP and the best placement found when the time is about
+                to run out is used. Defaults to None, all orientations are evaluated.
+            stats (PlacementStats, optional): collector of per-phase timers and counters. Defaults to None, nothing is collected.
+            frames (FrameWriter, optional): writer of snapshots of the layout as shapes are placed. Defaults to None.
+            checkpoint (str, optional): path the placement state is saved to, resume() continues from it. Defaults to None.
+            checkpoint_every (int, optional): number of placed shapes between checkpoints. Defaults to 100.
+            grid (int, optional): number of cells across the diameter of an occupancy grid bounding placements from below,
+                exact placements are searched only in a band above the bound. Defaults to 256, 0 disables the grid.
+            nfp_cache (int, optional): number of new hulls whose NFPs with types of placed hulls are cached,
+                repeated shapes then mostly reuse them. Defaults to 256, 0 disables the cache.
+            nfp_tolerance (float, optional): hull edges are quantized to it before hulls are compared, hulls that are
+                the same up to it share cached NFPs. Placements are off by up to the tolerance times the number of hull
+                edges, so it is at most nfp.MAX_TOLERANCE. Defaults to 1e-9.
+            beam (int, optional): number of layouts kept by a beam search in run(). Every layout is extended by the lowest
+                placements of the next shape over its orientations and the layouts leaving the least free area under
+                placed shapes are kept, in worker processes if workers are given and within the deadline of a shape
+                if there is one. Defaults to 0, shapes are placed greedily.
+            beam_depth (int, optional): number of shapes the beam search looks ahead. A shape is placed as in the best
+                layout once all layouts place it the same way or they were extended by this many shapes. Defaults to 8.
         """
         super().__init__(sg)
+        if search not in ('union', 'heap'):
+            raise ValueError(f"Unknown search mode {search}, expected 'union' or 'heap'")
         # count of placed shapes
         self._count = 0
+        # NFP engine holding geometry of placed shapes, in the order of self._sg._shapes
+        self._nfp = NFPEngine(cache_size=nfp_cache, tolerance=nfp_tolerance)
+        self._nfp_cache = nfp_cache
+        self._nfp_tolerance = nfp_tolerance
+        # placed shapes that can still be touched by a new shape
+        self._frontier = Frontier(self._sg._radius)
+        # memoized inner fit polygons of shapes in the circle
+        self._ifp = IFPEngine(self._sg._radius, ifp_segments)
+        self._ifp_segments = ifp_segments
+        # coarse occupancy of the circle, filled in the order of self._sg._shapes
+        self._grid = OccupancyGrid(self._sg._radius, grid) if grid else None
+        self._grid_cells = grid
+        # pool of processes evaluating orientations, exists while running
+        self._workers = workers
+        self._pool = None
+        # how the lowest placement of an orientation is found
+        self._search = search
+        # time budget of a shape, start of the current shape and whether some of its orientations were skipped
+        self._deadline = deadline
+        self._started = 0
+        self._cut = False
+        # returns whether the evaluation in progress was abandoned, set by worker processes(see parallel.py)
+        self._interrupted = None
+        # indices of placed shapes whose orientations were not all evaluated
+        self._cut_short = []
+        # per-phase timers and counters
+        self._stats = DISABLED if stats is None else stats
+        # snapshots of the layout, plotting is imported only by whoever creates the writer
+        self._frames = frames
+        # periodic checkpoints of the placement state
+        self._checkpoint = checkpoint
+        self._checkpoint_every = checkpoint_every
+        # number of layouts kept by the beam search and number of shapes it looks ahead
+        self._beam = beam
+        self._beam_depth = beam_depth
+
+
+    @classmethod
+    def streaming(cls, radius : float, rotations : int, **options):
+        """Placer for shapes coming from an outside source through stream(), no shape generator has to be written
+
+        Args:
+            radius (float): radius of the circle
+            rotations (int): angle of allowed rotations in degrees, 360 for none
+            **options: other constructor options
+
+        Returns:
+            MyPlacer: empty placer
+        """
+
+        return cls(ShapeGenerator(radius, Symmetry(rotations)), **options)
+
+
+    @classmethod
+    def resume(cls, path : str, **options):
+        """Placer continuing from a checkpoint. Its settings and caches are restored,
+        so the run continues with exactly the same placements as an uninterrupted one
+
+        Args:
+            path (str): path of the checkpoint
+            **options: other constructor options(workers, deadline, stats, frames, checkpoint, ...)
+
+        Returns:
+            MyPlacer: placer with the saved state
+        """
+
+        state = checkpoints.load(path)
+        settings = state['settings']
+        options.setdefault('checkpoint', path)
+        placer = cls(state['sg'], ifp_segments=settings['ifp_segments'], search=settings['search'],
+                     grid=settings['grid'], nfp_cache=settings['nfp_cache'], nfp_tolerance=settings['nfp_tolerance'], **options)
+        placer._count = state['count']
+        placer._cut_short = state['cut_short']
+        placer._nfp, placer._frontier, placer._ifp = state['nfp'], state['frontier'], state['ifp']
+        return placer
+
+
+    def save_checkpoint(self, path : str):
+        """Saves the placement state atomically: the generator with placed shapes, its random state
+        and pending shape, the count of placed shapes and the NFP, frontier and IFP caches
+
+        Args:
+            path (str): path of the checkpoint
+        """
+
+        self._cache_placed_shapes()
+        checkpoints.save(path, {'settings': self._settings(), 'sg': self._sg, 'count': self._count,
+                               'cut_short': self._cut_short, 'nfp': self._nfp, 'frontier': self._frontier, 'ifp': self._ifp})
+
+
+    def fork(self):
+        """Copy of the placer sharing its layout, made in O(1) regardless of the number of placed shapes.
+        Placed shapes and structures derived from them are shared until a copy places a shape: arrays
+        are appended in place by the first copy to grow and copied once by the others, the occupancy grid
+        is copied by a copy that changes it while others share it and lists of pockets are replaced. Either
+        copy can then place shapes without changing the other, IFPs do not depend on the layout and stay shared
+
+        Returns:
+            MyPlacer: placer with the same placed shapes, without a pool, statistics, frames or checkpoints
+        """
+
+        self._cache_placed_shapes()
+        placer = copy(self)
+        placer._sg = self._sg.fork()
+        placer._nfp = self._nfp.fork()
+        placer._frontier = self._frontier.fork()
+        placer._grid = None if self._grid is None else self._grid.fork()
+        placer._cut_short = list(self._cut_short)
+        placer._pool, placer._stats, placer._frames, placer._checkpoint = None, DISABLED, None, None
+        return placer
+
+
+    @classmethod
+    def mirror(cls, settings : dict):
+        """Placer with no placed shapes and the same settings as another placer,
+        used to mirror its state in a worker process
+
+        Args:
+            settings (dict): settings of the other placer
+
+        Returns:
+            MyPlacer: empty placer
+        """
+
+        sg = ShapeGenerator(settings['radius'], Symmetry(settings['rotations']))
+        return cls(sg, ifp_segments=settings['ifp_segments'], search=settings['search'], grid=settings['grid'],
+                   nfp_cache=settings['nfp_cache'], nfp_tolerance=settings['nfp_tolerance'])
+
+
+    def _settings(self):
+        """Settings needed to construct a mirror of this placer
+
+        Returns:
+            dict: radius, rotations, IFP tessellation, search mode, occupancy grid size, NFP cache size and tolerance
+        """
+
+        return {'radius': self._sg._radius, 'rotations': int(self._sg._rotations), 'ifp_segments': self._ifp_segments,
+                'search': self._search, 'grid': self._grid_cells, 'nfp_cache': self._nfp_cache,
+                'nfp_tolerance': self._nfp_tolerance}
+
+
+    @property
+    def cut_short(self):
+        """Placed shapes that were placed before all their orientations were evaluated, because of the deadline
+
+        Returns:
+            List(int): indices of the shapes in the order they were placed
+        """
+
+        return self._cut_short
+
+
+    @property
+    def nfp_cache_info(self):
+        """Counters of the NFP cache
+
+        Returns:
+            dict: NFPs of placed shapes taken from the cache(hits) and computed(misses), number of cached new hulls,
+                the limit and number of types of placed hulls
+        """
+
+        return self._nfp.cache_info()
+
+
+    @property
+    def stats(self):
+        """Per-phase timers and counters of placed shapes, collected only if a collector was given
+
+        Returns:
+            PlacementStats: collector of this placer
+        """
+
+        return self._stats
 
 
     def run(self):
@@ -33,541 +256,896 @@ class MyPlacer(Placer):
             ShapeGenerator: Shape generator object that is filled with placed shapes
         """
 
-        # no rotations
-        if self._sg._rotations == 360:
-            # loop runs until a shape cannot be placed
-            while(True):
-                # get new shape and its placements
-                poly = self._sg.new_shape()
-                lines = self._feasible_placements(Polygon(poly))
-
-                # no placement available
-                if not lines:
-                    break
+        self._open()
+        try:
+            return self._beam_run() if self._beam > 1 else self._run()
+        finally:
+            self._close()
 
-                # lowest placement point
-                point = self._placer(lines)
 
-                # highest point of polygon
-                highp = self._highest_point(poly)
+    def stream(self, shapes : Iterable, ahead : int = 0):
+        """Places shapes from an outside source one by one and yields every decision as soon as it is made.
+        Unlike run(), a shape that cannot be placed does not end the stream, the consumer decides when to stop
 
-                # vector from highest vertex of polygon to its first
-                dist_hp_firstp = (poly[0][0] - highp[0], poly[0][1] - highp[1])\
-                
-                # place the shape 
-                self._sg.place_shape(point[0] + dist_hp_firstp[0], point[1] + dist_hp_firstp[1], 0)
-                self._count+=1
+        Args:
+            shapes (Iterable): shapes given as lists of vertices, or a callable returning the next shape and None at the end
+            ahead (int, optional): number of decisions computed in a background thread before the consumer takes them,
+                so that the consumer's work overlaps the next placement. Shapes placed by decisions the consumer did not
+                take when it stops are removed again. Defaults to 0, computed when asked for.
+
+        Yields:
+            Placement: index of the shape in the stream, the shape, position of its first point, rotation,
+                whether it was placed and seconds taken
+        """
 
+        if self._beam > 1:
+            raise ValueError("Beam search looks ahead at shapes of the generator in run(), stream() places them greedily")
+        source = iter(shapes, None) if callable(shapes) else iter(shapes)
+        if ahead <= 0:
+            yield from self._stream(source)
+            return
+        # the layout after the last decision taken by the consumer
+        state = (len(self._sg._shapes), self._count, len(self._cut_short))
+        decisions = prefetch(self._stream(source, states=True), ahead)
+        try:
+            for placement, state in decisions:
+                yield placement
+        finally:
+            # waits for the producer, then drops placements computed ahead
+            decisions.close()
+            self._rollback(*state)
+
+
+    def place(self, shape : List, index : int = 0):
+        """Places a single shape from an outside source and returns the decision. If placing fails part way,
+        the layout is rolled back to the shapes placed before and the error is raised. Orientations are evaluated
+        by the pool of the placer if it was started(see _open()), so a long-lived caller keeps one pool
 
-        else:
-            # loop runs until a shape cannot be placed in any possible orientation
-            while(True):
-                # get new shape
-                poly = self._sg.new_shape()
+        Args:
+            shape (List(List(int, int))): shape given by its vertices
+            index (int, optional): index of the shape in its stream. Defaults to 0.
 
-                can_be_placed = False   # true if shape can be placed in any rotation
-                rotation = 0    # current orientation of shape
-                point = (0, 100)    # ridiculously high point, will be overriden
-
-                # try all roatations
-                for i in range(360//self._sg._rotations):
-                    # turn the shape by specified angle, get placements for current orientation
-                    poly = self._sg._rotate_shape(poly, self._sg._rotations)
-                    lines = self._feasible_placements(Polygon(poly))
-
-                    
-                    if not lines:
-                        # no placement available, try another rotation
-                        continue
-                    can_be_placed = True
-
-                    # get lowest placement for curr. orientation
-                    pnt = self._placer(lines)
-
-                    if pnt[1] < point[1]:
-                        # if lowest placement for curr. orientation is lower than the one for previous orientations
-                        point = pnt
-                        rotation = i+1  # save the number of rotations of the shape
-                    elif pnt[1] == point[1] and pnt[0] < point[0]:
-                        # same height but the newer placement is more to the left
-                        point = pnt
-                        rotation = i+1
-
-                
-                if not can_be_placed:
-                    # no placement found over all orientations
-                    break
-                
-                # rotate shape into its correct orientation to find vector from first point to highest point
-                poly = self._sg._rotate_shape(poly, self._sg._rotations*rotation)
-                highp = self._highest_point(poly)
-                dist_hp_firstp = (poly[0][0] - highp[0], poly[0][1] - highp[1])
+        Returns:
+            Placement: index of the shape, the shape, position of its first point, rotation,
+                whether it was placed and seconds taken
+        """
 
-                # place shape 
-                self._sg.place_shape(point[0] + dist_hp_firstp[0], point[1] + dist_hp_firstp[1], rotation*self._sg._rotations)
-                self._count += 1
+        start = perf_counter()
+        placed, count, cut = len(self._sg._shapes), self._count, len(self._cut_short)
+        try:
+            poly = self._sg.accept_shape(shape)
+            placement = self._place(poly)
+            if placement is None:
+                self._sg.skip_shape()
+        except BaseException:
+            self._rollback(placed, count, cut)
+            raise
+        if placement is None:
+            return Placement(index, shape, None, None, None, False, perf_counter() - start)
+        x, y, rotation = placement
+        return Placement(index, shape, float(x), float(y), int(rotation), True, perf_counter() - start)
+
+
+    def query(self, shapes : Iterable, workers : int = None):
+        """Best placements of a batch of shapes against the current layout, none of them is placed.
+        The layout is frozen for the whole batch, structures derived from placed shapes(hulls, pockets,
+        the occupancy grid) are brought up to date once and shared by all shapes. With workers,
+        orientations of all shapes are evaluated in a single pass over the pool
 
-        return self._sg
+        Args:
+            shapes (Iterable): shapes given as lists of vertices
+            workers (int, optional): number of worker processes, the pool of a running placer is used if there is one.
+                Defaults to None, the placer's workers.
 
+        Returns:
+            List(Candidate): index of the shape in the batch, the shape, position of its first point, rotation,
+                whether it fits and the height of its highest point, lower is better
+        """
 
-    def _placer(self, lines : List):
-        """Finds lowes point out of all possible placements
+        shapes = [[list(corner) for corner in shape] for shape in shapes]
+        self._cache_placed_shapes()
+        orientations = [self._orientations(shape) for shape in shapes]
+
+        workers = self._workers if workers is None else workers
+        pool = self._pool
+        if pool is None and workers > 1 and shapes:
+            pool = OrientationPool(workers)
+        try:
+            if pool is not None:
+                flat = iter(pool.placements(self, [o for batch in orientations for _, o in batch]))
+                points = [[next(flat) for _ in batch] for batch in orientations]
+            else:
+                points = []
+                for batch in orientations:
+                    self._started = perf_counter()
+                    points.append(self._orientation_points(batch))
+        finally:
+            if pool is not None and pool is not self._pool:
+                pool.close()
+
+        candidates = []
+        for i, (shape, batch, found) in enumerate(zip(shapes, orientations, points)):
+            best = self._best_placement(batch, found)
+            if best is None:
+                candidates.append(Candidate(i, shape, None, None, None, False, None))
+            else:
+                x, y, rotation, top = best
+                candidates.append(Candidate(i, shape, float(x), float(y), int(rotation), True, float(top)))
+        return candidates
+
+
+    def _stream(self, source : Iterator, states : bool = False):
+        """Placing loop of stream()
 
         Args:
-            lines (List(List(Tuple(int, int)))): List of lines along which a shape can be placed
+            source (Iterator): shapes
+            states (bool, optional): whether every decision comes with the counts of placed shapes, placed shapes
+                and shapes cut short after it, which _rollback() goes back to. Defaults to False.
 
-        Returns:
-            Tuple(int, int): lowest point out of all lines
+        Yields:
+            Placement: decision for every shape
         """
 
-        points = []
-        for line in lines:
-            points.append(self._lowest_point(line))
+        self._open()
+        try:
+            for index, shape in enumerate(source):
+                placement = self.place(shape, index)
+                if states:
+                    yield placement, (len(self._sg._shapes), self._count, len(self._cut_short))
+                else:
+                    yield placement
+        finally:
+            self._close()
 
-        return self._lowest_point(points)
 
+    def _open(self):
+        """Starts the pool of processes evaluating orientations, if there should be one"""
 
-    def _feasible_placements(self, polygon : Polygon):
-        """Finds lines along which the shape can be placed. A line is where a shape can be placed by
-        its highest point so that it touches another shape/the edge of the circle
+        # the beam search has its own workers
+        if self._workers > 1 and self._sg._rotations != 360 and self._beam < 2 and self._pool is None:
+            self._pool = OrientationPool(self._workers)
 
-        An inner-fit polygon(IFP) for the shape and the circle 
-        and a no-fit polygon(NFP) for the shape and all currently placed shapes
-        are found, then an intersection of the two is constructed.
-        Finally, the intersection is stripped of parts that are inside the NFP and
-        would result in overlapping
 
-        Args:
-            polygon (Polygon): shape to find placement lines
+    def _close(self):
+        """Stops the pool and flushes statistics and frames"""
+
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+        self._stats.close()
+        if self._frames is not None:
+            self._frames.close(self._sg._shapes)
+
+
+    def _run(self):
+        """Placing loop of run()
 
         Returns:
-            List(List(Tuple(int, int))): List of lines. A line consists of points representing vertices
+            ShapeGenerator: Shape generator object that is filled with placed shapes
         """
 
-        ifp = self._polygon_to_coords(self._inner_fit_circle(polygon).convex_hull)
+        # loop runs until a shape cannot be placed or a replayed trace has no more shapes
+        while(True):
+            try:
+                poly = self._sg.new_shape()
+            except TraceExhausted:
+                break
+            if self._place(poly) is None:
+                break
 
-        # if no shape has been placed yet
-        if not self._sg._shapes:
-            return [ifp]
+        return self._sg
 
-        # get NFP
-        nfp = self._no_fit_polygons(polygon)
-
-        # intersection of IFP and NFP
-        final = nfp.intersection(Polygon(ifp))
-
-        lines = []
-
-        # if the intersection is a has a single exterior
-        if isinstance(final, Polygon):
-            # removal of IFP part
-            line = self._remove_back_parts(final, nfp)
-            if line:
-                # append non empty lines
-                lines.append(line)  
-            # add interiors as well
-            for interior in final.interiors:
-                lines.append(list(interior.coords))
-        # if the intersection has multiple exteriors
-        elif isinstance(final, MultiPolygon):
-            for plgn, plgf in zip(nfp, final):
-                # removal of the IFP part
-                line = self._remove_back_parts(plgf, plgn)
-                if line:
-                    # append non empty lines
-                    lines.append(line)
-                # add interiors as well
-                for interior in plgf.interiors:
-                    lines.append(list(interior.coords))
-
-        return lines
-
-    def _no_fit_polygons(self, polygon : Polygon):
-        """Compute no fit polygon of a new shape and all placed shapes
-        by computing no fit polygons for all placed shapes and a new shape
-        and then taking their union
 
-        Args:
-            polygon (Polygon): new shape
+    def _beam_run(self):
+        """Placing loop of run() with beam search. Shapes are taken from the generator one by one as in the greedy
+        loop, the search looks ahead at the next ones taken from a fork of the generator, which continues the same
+        sequence. The current shape is placed as in the best layout once all layouts place it the same way or they
+        look beam_depth shapes ahead. If the generator gives another shape than its fork did, the search starts
+        over from the placed shapes. A resumed run starts it over as well
 
         Returns:
-            Polygon: no fit polygon
+            ShapeGenerator: Shape generator object that is filled with placed shapes
         """
 
-        nfps = []
-        for shape in self._sg._shapes:
-            nfps.append(self._fit_nfp(Polygon(shape), self._minkowski_difference(Polygon(shape), polygon)))
-        nfp = unary_union(nfps)
-        return nfp
-        
+        search, ahead, pending = None, None, []
+        try:
+            while True:
+                try:
+                    poly = self._sg.new_shape()
+                except TraceExhausted:
+                    break
+                self._stats.begin_shape()
+                self._started = perf_counter()
+                self._cut = False
+
+                if search is not None and pending and pending[0] != poly:
+                    search.close()
+                    search = None
+                if search is None:
+                    search = BeamSearch(self, self._beam, self._workers)
+                    # the fork continues after the current shape
+                    ahead = self._sg.fork()
+                    ahead.skip_shape()
+                    pending = []
+                # the deadline of the shape is shared by all steps taken before it is committed
+                if not pending:
+                    pending.append(poly)
+                    self._beam_step(search, poly)
+                while ahead is not None and search.depth < self._beam_depth and not search.agreed():
+                    if self._deadline is not None and perf_counter() >= self._started + self._deadline:
+                        self._cut = True
+                        break
+                    shape = self._lookahead_shape(ahead)
+                    if shape is None:
+                        ahead = None
+                        break
+                    pending.append(shape)
+                    self._beam_step(search, shape)
+
+                placement = search.commit()
+                pending.pop(0)
+                if placement is None:
+                    self._stats.end_shape(False)
+                    break
+                self._commit(placement)
+        finally:
+            if search is not None:
+                search.close()
+
+        return self._sg
+
 
-    def _remove_back_parts(self, isc : Polygon, nfp : Polygon):
-        """Removes parts which remain in the intersection of NFP and IFP which belong to inner fit polygon
+    def _beam_step(self, search : BeamSearch, shape : List):
+        """Extends the branches of a beam search by a shape within the time left for the current shape
 
         Args:
-            isc (Polygon): intersection of IFP and NFP
-            nfp (Polygon): no fit polygon
+            search (BeamSearch): search
+            shape (List(List(int, int))): shape given by its vertices
+        """
+
+        budget = None if self._deadline is None else max(self._started + self._deadline - perf_counter(), 0)
+        search.step(shape, budget)
+        if search.dropped:
+            self._cut = True
+
+
+    def _lookahead_shape(self, ahead : ShapeGenerator):
+        """Next shape of a fork of the generator, used to look ahead
+
+        Args:
+            ahead (ShapeGenerator): fork of the generator
 
         Returns:
-            List(Tuple(int, int)): true intersection(points from NFP that are inside of IFP)
+            List(List(int, int)): shape, None if the generator has no more shapes
         """
-        
-        # Conversion from Polygon to list of coords
-        isc = self._polygon_to_coords(isc)
-        nfp = self._polygon_to_coords(nfp)
 
-        true_isc = []
+        try:
+            shape = ahead.new_shape()
+        except TraceExhausted:
+            return None
+        ahead.skip_shape()
+        return shape
 
-        # Check coords if theyre in true intersection
-        for coord in isc:
-            # if the coord is a vertex of the NFP
-            if coord in nfp:
-                true_isc.append(coord)
 
-        return true_isc
+    def _place(self, poly : List):
+        """Finds the lowest placement of the current shape of the generator and places it there
 
+        Args:
+            poly (List(Tuple(int, int))): current shape
 
-    def _inner_fit_circle(self, polygon : Polygon):
-        """ Inner fit polygon for circle and a shape to be placed.
-            Created by sliding the shape around the circle in a counter-clockwise direction
-            The shape is placed by its highest point
+        Returns:
+            Tuple(int, int, int): position of the first point of the shape and its rotation, None if it cannot be placed
+        """
+
+        self._stats.begin_shape()
+        self._started = perf_counter()
+        self._cut = False
+
+        placement = self._decide(poly)
+        if placement is None:
+            self._stats.end_shape(False)
+            return None
+        return self._commit(placement)
+
+
+    def _commit(self, placement : Tuple):
+        """Places the current shape of the generator where it was decided and updates the placer's state
 
         Args:
-            polygon (Polygon): input shape to make IFP
+            placement (Tuple(int, int, int)): position of the first point of the shape and its rotation
 
         Returns:
-            Polygon: IFP
+            Tuple(int, int, int): the placement
         """
 
-        #orient shape ccw
-        polygon,_ = self._orient_shapes(polygon)
-        polygon = self._polygon_to_coords(polygon)
+        # place the shape
+        with self._stats.phase('validate'):
+            self._sg.place_shape(*placement)
+        if self._cut:
+            self._cut_short.append(self._count)
+        self._count += 1
+        self._cache_placed_shapes()
+        self._stats.end_shape(True)
+        if self._frames is not None:
+            self._frames.update(self._sg._shapes)
+        if self._checkpoint is not None and self._count % self._checkpoint_every == 0:
+            self.save_checkpoint(self._checkpoint)
+        return placement
+
+
+    def _decide(self, poly : List):
+        """Finds the lowest placement of a shape. If a rotation is specified,
+        it picks the lowest placement over all possible orientations
 
-        # when polygon collides, change its direction by this angle(degs)
-        angle_size = 4  
+        Args:
+            poly (List(Tuple(int, int))): shape
 
-        # center the polygon, place it by its highest point to (0,0)
-        highestp = self._highest_point(polygon)
-        dist_hp_firstp = (polygon[0][0] - highestp[0], polygon[0][1] - highestp[1])
-        highestp = (0,0)
-        polygon = self._sg._translate_shape(polygon, 0 + dist_hp_firstp[0], 0 + dist_hp_firstp[1])
+        Returns:
+            Tuple(int, int, int): position of the first point of the shape and its rotation, None if it cannot be placed
+        """
 
-        #place polygon to the edge
-        move_vect, intersection = self._slide(polygon, (1,0))
-        polygon = self._sg._translate_shape(polygon, 
-                    polygon[0][0] + move_vect[0], polygon[0][1] + move_vect[1])
-        
-        #set up first point of inner fit polygon
-        highestp = (highestp[0] + move_vect[0], highestp[1] + move_vect[1])
-        inner_fit = [highestp]
-
-        #get starting angle
-        move_vect = self._perpendicular_left_vector(intersection)
-
-        for i in range(0, int(math.ceil(360/angle_size))-1):
-            move_vect = self._ccw_rotation(move_vect,angle_size)    #get angle of slide
-            move_vect,_ = self._slide(polygon, move_vect)   #calculate slide length of polygon
-            
-            #if the shape can move
-            if move_vect[0] != 0 or move_vect[1] != 0:
-                #move the polygon
-                polygon = self._sg._translate_shape(polygon, polygon[0][0] + move_vect[0], polygon[0][1] + move_vect[1])
-                #add inner fit polygon vertex
-                highestp = (highestp[0] + move_vect[0], highestp[1] + move_vect[1])     
-                inner_fit.append(highestp)
-        
-        return Polygon(inner_fit)
+        orientations = self._orientations(poly)
+        best = self._best_placement(orientations, self._orientation_points(orientations))
+        return None if best is None else best[:3]
 
 
-    def _slide(self, polygon : Polygon, direction : Tuple):
-        """returns multiple of direction vector in which the shape can maximally move
-        and the point where it "crashes" into wall(IFP)
+    def _orientations(self, poly : List):
+        """Orientations of a shape allowed by the symmetry
 
         Args:
-            polygon (Polygon): shape to be slid
-            direction (Tuple(int, int)): direction(vector) of shape
+            poly (List(Tuple(int, int))): shape
 
         Returns:
-            Tuple(int, int): direction vector(its length is the length of the movement)
-            Tuple(int, int): final point of the shape's slide(intersection with IFP)
+            List(Tuple(int, List(Tuple(int, int)))): rotation in degrees and the shape in it for every orientation
         """
 
-        polygon = self._polygon_to_coords(polygon)
-        direction = self._normalize_vector(direction)
-        smallest_mult = self._sg._radius*100
-        point_of_intersection = (0,0)
+        if self._sg._rotations == 360:
+            return [(0, poly)]
 
-        #for each point compute its intersection with circle under given direction
-        #solve equation (direction)^2 * k^2 + 2(direction . point)*t + (point)^2 - radius^2
-        #take the lowest moving distance so that the polygon stays in the circle
-        for point in polygon[:-1]:
-            a = self._dot_product(direction, direction)
-            b = 2*self._dot_product(direction, point)
-            c = self._dot_product(point, point) - self._sg._radius**2
-            discriminant = b**2 -4*a*c
-            if discriminant >= 0:
-                mult = (-b + math.sqrt(discriminant))/(2*a)
-                if mult - 0.01 < smallest_mult:
-                    smallest_mult = mult-0.01
-                    point_of_intersection = (point[0] + direction[0]*mult, point[1] + direction[1]*mult)
-        
-        return (direction[0]*smallest_mult, direction[1]*smallest_mult), point_of_intersection
+        # turn the shape by specified angle to get all orientations
+        orientations = []
+        for i in range(360//self._sg._rotations):
+            poly = self._sg._rotate_shape(poly, self._sg._rotations)
+            orientations.append(((i+1)*self._sg._rotations, poly))
+        return orientations
 
 
-    def _ccw_rotation(self, vector : Tuple, degs : int):
-        """Rotate a vector counterclockwise
+    def _candidates(self, poly : List, count : int):
+        """Lowest placements of a shape over all its orientations, used to look ahead.
+        Orientations whose hulls are the same up to translation give the same layouts, only the first one is evaluated
 
         Args:
-            vector (Tuple(int, int)): Vector to be rotated
-            degs (int): rotation angle in degs
+            poly (List(Tuple(int, int))): shape
+            count (int): number of placements
 
         Returns:
-            Tuple(int, int): Rotated vector
+            List(Tuple(int, int, int, int, float)): up to count placements, lowest then leftmost first, as position of the first point
+                of the shape, its rotation, the height of its highest point and the free area left under it(see OccupancyGrid.gap())
         """
 
-        degs = math.radians(degs)
-        return (vector[0]*math.cos(degs) - vector[1]*math.sin(degs), vector[0]*math.sin(degs) + vector[1]*math.cos(degs))
-
-
-    def _dot_product(self, v1 : Tuple, v2 : Tuple):
-        """Dot product of two vectors
+        found, seen = [], set()
+        for rotation, oriented in self._orientations(poly):
+            key, _ = self._canonical_orientation(oriented)
+            if key in seen:
+                continue
+            seen.add(key)
+            for point in self._orientation_placement(oriented, count=count):
+                found.append((point[1], point[0], rotation, oriented))
+        found.sort(key=lambda f: f[:2])
+        candidates = []
+        for y, x, rotation, oriented in found[:count]:
+            highp = self._highest_point(oriented)
+            placed = Polygon(np.asarray(oriented, dtype=float) + (x - highp[0], y - highp[1]))
+            gap = 0.0 if self._grid is None else self._grid.gap(placed)
+            candidates.append(self._best_placement([(rotation, oriented)], [(x, y)]) + (gap,))
+        return candidates
+
+
+    def _orientation_points(self, orientations : List):
+        """Finds lowest placement for every orientation of a shape
 
         Args:
-            v1 (Tuple(int, int)): First vector
-            v2 (Tuple(int, int)): Second vector
+            orientations (List(Tuple(int, List(Tuple(int, int))))): rotation and the shape in it for every orientation
 
         Returns:
-            int: Dot product of v1 and v2
+            List(Tuple(int, int)): lowest placement point for every orientation, None if it cannot be placed
         """
 
-        return v1[0]*v2[0] + v1[1]*v2[1]
+        # no rotations
+        if self._sg._rotations == 360:
+            return [self._orientation_placement(orientations[0][1])]
+        return self._orientation_placements([o for _, o in orientations])
 
 
-    def _perpendicular_left_vector(self, vector : Tuple):
-        """Finds left perpendicular vector
+    def _best_placement(self, orientations : List, points : List):
+        """Picks the lowest, then leftmost placement over orientations of a shape
 
         Args:
-            vector (Tuple(int,int)): Input vector
+            orientations (List(Tuple(int, List(Tuple(int, int))))): rotation and the shape in it for every orientation
+            points (List(Tuple(int, int))): lowest placement point of every orientation, None if it cannot be placed
 
         Returns:
-            Tuple(int, int): Left perpendicular vector
+            Tuple(int, int, int, int): position of the first point of the shape, its rotation and the height
+                of its highest point, None if it cannot be placed in any orientation
         """
 
-        return self._normalize_vector((-vector[1], vector[0]))
-            
-
-    def _normalize_vector(self, vector : Tuple):
-        """Normalizes a vector
+        best = None
+        for i, point in enumerate(points):
+            if point is None:
+                # no placement available, try another rotation
+                continue
+            if best is None or point[1] < points[best][1] or (point[1] == points[best][1] and point[0] < points[best][0]):
+                # lower, or same height but more to the left than the placements of previous orientations
+                best = i
+
+        if best is None:
+            # no placement found over all orientations
+            return None
+
+        # take the evaluated orientation to find vector from first point to highest point,
+        # rotating the shape again could pick another highest point of a horizontal edge
+        rotation, poly = orientations[best]
+        point = points[best]
+        highp = self._highest_point(poly)
+        dist_hp_firstp = (poly[0][0] - highp[0], poly[0][1] - highp[1])
+        return (point[0] + dist_hp_firstp[0], point[1] + dist_hp_firstp[1], rotation, point[1])
+
+
+    def _orientation_placements(self, orientations : List):
+        """Finds lowest placement for every orientation of a shape, in worker processes if there is a pool.
+        Orientations whose hulls are the same up to translation are evaluated only once,
+        the placement is then shifted by the difference of their highest points
 
         Args:
-            vector (Tuple(int, int)): Vector to be normalized
+            orientations (List(List(Tuple(int, int)))): shape in every orientation
 
         Returns:
-            Tuple(int, int): Normalized vector
+            List(Tuple(int, int)): lowest placement point for every orientation, None if it cannot be placed
         """
 
-        euc = self._euclidean_dist(vector)
-        return (vector[0]/euc, vector[1]/euc)
-    
+        # first orientation with the same hull and offset of the highest point from the hull's anchor
+        first, source, offsets, unique = {}, [], [], []
+        for i, poly in enumerate(orientations):
+            key, offset = self._canonical_orientation(poly)
+            offsets.append(offset)
+            if key not in first:
+                first[key] = i
+                unique.append(i)
+            source.append(first[key])
+
+        if self._pool is not None:
+            timeout = None if self._deadline is None else self._started + self._deadline - perf_counter()
+            found = self._pool.placements(self, [orientations[i] for i in unique], timeout)
+            self._cut = SKIPPED in found
+            found = [None if p == SKIPPED else p for p in found]
+        else:
+            found = self._anytime_placements([orientations[i] for i in unique])
+        found = dict(zip(unique, found))
+
+        points = []
+        for i, j in enumerate(source):
+            point = found[j]
+            if point is not None and j != i:
+                point = (point[0] + offsets[i][0] - offsets[j][0], point[1] + offsets[i][1] - offsets[j][1])
+            points.append(point)
+        return points
+
 
-    def _euclidean_dist(self, point : Tuple):
-        """Euclidean distance from (0,0)
+    def _anytime_placements(self, orientations : List):
+        """Finds lowest placements of orientations of a shape until the deadline of the shape is about to expire.
+        Orientations are evaluated in the order of their lower bounds(the lowest point of the IFP or the bound
+        given by the occupancy grid, whichever is higher), which no placement can be under, so orientations
+        that cannot beat the best placement found are skipped. With a deadline, evaluation stops early
+        when the longest evaluation so far would not fit into the remaining time and a placement was found
 
         Args:
-            point (Tuple(int, int)): Point
+            orientations (List(List(Tuple(int, int)))): shape in every orientation
 
         Returns:
-            int: Euclidean distace of point from (0,0)
+            List(Tuple(int, int)): lowest placement point for every orientation, None if it cannot be placed or was not evaluated
         """
 
-        return math.sqrt(point[0]**2 + point[1]**2)
+        bounds, lows = [], []
+        for poly in orientations:
+            polygon = Polygon(poly)
+            ifp = self._inner_fit_circle(polygon)
+            # the grid is not asked about orientations that do not fit into the circle
+            low = math.inf if ifp.is_empty else self._grid_bound(polygon)
+            lows.append(low)
+            bounds.append(math.inf if ifp.is_empty else max(self._lowest_point(ifp)[1], low))
+
+        points = [None] * len(orientations)
+        best, longest = None, 0
+        for i in sorted(range(len(orientations)), key=lambda i: bounds[i]):
+            if bounds[i] == math.inf or (best is not None and bounds[i] > best[1]):
+                break
+            if self._deadline is not None and best is not None and perf_counter() + longest > self._started + self._deadline:
+                self._cut = True
+                break
+
+            start = perf_counter()
+            points[i] = self._orientation_placement(orientations[i], lows[i])
+            longest = max(longest, perf_counter() - start)
+            if points[i] is not None and (best is None or (points[i][1], points[i][0]) < (best[1], best[0])):
+                best = points[i]
+
+        return points
+
+
+    def _canonical_orientation(self, poly : List, decimals : int = 9):
+        """Key of an orientation of a shape which is the same for all orientations
+        whose convex hulls are the same up to translation
 
+        Args:
+            poly (List(Tuple(int, int))): shape in its orientation
+            decimals (int, optional): precision of the compared hull vertices. Defaults to 9.
 
-    def _highest_point(self, poly : Polygon):
-        """ Finds highest, eventually the highest point which is also the rightest
+        Returns:
+            Tuple: sorted hull vertices relative to the lowest(then leftmost) vertex
+            Tuple(int, int): offset of the highest point of the shape from that vertex
+        """
+
+        hull = np.asarray(Polygon(poly).convex_hull.exterior.coords)[:-1]
+        rounded = np.round(hull, decimals)
+        anchor = hull[np.lexsort((rounded[:, 0], rounded[:, 1]))[0]]
+        key = tuple(sorted(map(tuple, np.round(hull - anchor, decimals).tolist())))
+
+        highp = self._highest_point(poly)
+        return key, (highp[0] - anchor[0], highp[1] - anchor[1])
+
+
+    def _orientation_placement(self, poly : List, low : float = None, count : int = None):
+        """Finds lowest placement of a shape in a single orientation
 
         Args:
-            poly Polygon: Shape
+            poly (List(Tuple(int, int))): shape in its orientation
+            low (float, optional): lower bound of the placement given by the occupancy grid. Defaults to None, it is computed.
+            count (int, optional): number of lowest placements returned as a list. Defaults to None, the lowest one alone.
 
         Returns:
-            (int, int): Highest point of shape
+            Tuple(int, int): lowest placement point, None if the shape cannot be placed, or a list of up to count lowest ones
         """
 
-        coords = self._polygon_to_coords(poly)
+        with self._stats.orientation():
+            polygon = Polygon(poly)
+            if low is None:
+                low = math.inf if self._inner_fit_circle(polygon).is_empty else self._grid_bound(polygon)
+            if low == math.inf:
+                return None if count is None else []
+            # placements are not lower than the bound, shapes under it cannot block them
+            band = None if low == -math.inf else (low, self._sg._radius)
 
-        point = coords[0]
+            if self._search == 'heap':
+                return self._heap_placement(polygon, band, count)
 
-        for p in coords:
-            if p[1] > point[1]:
-                point = p
-            elif p[1] == point[1]:
-                if p[0] > point[0]:
-                    point = p
-        
-        return point
+            lines = self._feasible_placements(polygon, band)
+            if not lines or (self._interrupted is not None and self._interrupted()):
+                return None if count is None else []
+            with self._stats.phase('select'):
+                return self._placer(lines, polygon, band, count)
 
 
-    def _fit_nfp(self, poly : Polygon, nfp : List):
-        """Fits NFP to an already placed polygon by matching them by their lowest points
+    def _grid_bound(self, polygon : Polygon):
+        """Lower bound of the placement of a shape given by the occupancy grid, lowered by a cell as a margin
 
         Args:
-            poly (Polygon): A shape that is already placed
-            nfp (List(Tuple(int, int))): no fit polygon of shape above
+            polygon (Polygon): shape in its orientation
 
         Returns:
-            Polygon: placed NFP
+            float: no placement is lower, -inf if there is no grid or no placed shape,
+                inf if the shape cannot be placed
         """
 
-        x, y = self._lowest_point(poly)
-        return Polygon(self._sg._translate_shape(nfp, x, y))
+        if self._grid is None or not self._sg._shapes:
+            return -math.inf
 
+        self._cache_placed_shapes()
+        with self._stats.phase('grid'):
+            low = self._grid.lower_bound(polygon, self._highest_point(polygon))
+        if low is None:
+            self._stats.count('grid_rejected')
+            return math.inf
+        return low - self._grid.cell_size
 
-    def _lowest_point(self, poly : Polygon):
-        """ Finds lowest, eventually the lowest point which is also the leftest
+
+    def _heap_placement(self, polygon : Polygon, band : Tuple = None, count : int = None):
+        """Finds lowest placement of a shape by visiting candidate points of NFPs in increasing height,
+        the first one inside the IFP and outside all NFPs is returned
 
         Args:
-            poly Polygon: Shape
+            polygon (Polygon): shape in its orientation
+            band (Tuple(float, float), optional): bottom and top of heights the placement is searched in. Defaults to None, the whole circle.
+            count (int, optional): number of lowest placements returned as a list. Defaults to None, the lowest one alone.
 
         Returns:
-            (int, int): Lowest point of shape
+            Tuple(int, int): lowest placement point, None if the shape cannot be placed, or a list of up to count lowest ones
         """
 
-        coords = self._polygon_to_coords(poly)
+        ifp = self._inner_fit_circle(polygon)
 
-        point = coords[0]
+        # shape does not fit into the circle
+        if ifp.is_empty:
+            return None if count is None else []
+        if band is not None:
+            ifp = ifp.intersection(shapely.box(-self._sg._radius, band[0], self._sg._radius, band[1]))
 
-        for p in coords:
-            if p[1] < point[1]:
-                point = p
-            elif p[1] == point[1]:
-                if p[0] < point[0]:
-                    point = p
-        
-        return point
+        # if no shape has been placed yet
+        if not self._sg._shapes:
+            return self._lowest_point(ifp) if count is None else [self._lowest_point(ifp)]
+
+        self._cache_placed_shapes()
+        with self._stats.phase('nfp'):
+            near = self._near(polygon, band)
+            vertices = self._nfp.no_fit_polygons(polygon, near)
+            # only shapes that can be touched give candidates, all of them can block one
+            active = self._frontier.active(polygon)
+            if near is not None:
+                active = np.flatnonzero(np.isin(near, active))
+        self._stats.count('nfp_vertices', vertices.shape[0] * vertices.shape[1])
+        with self._stats.phase('search'):
+            return lowest_feasible_point(vertices, active, ifp, count=count, interrupted=self._interrupted)
+
+
+    def _placer(self, lines : List, polygon : Polygon = None, band : Tuple = None, count : int = None):
+        """Finds lowes point out of all possible placements
 
+        Args:
+            lines (List(List(Tuple(int, int)))): List of lines along which a shape can be placed
+            polygon (Polygon, optional): shape to be placed. If given, points where the shape
+                would overlap a shape left out of the NFP are skipped. Defaults to None.
+            band (Tuple(float, float), optional): bottom and top of heights the lines were searched in, points
+                outside of it are skipped and only shapes reaching into it can be overlapped. Defaults to None, the whole circle.
+            count (int, optional): number of lowest valid points returned as a list, the shape has to be given.
+                Defaults to None, the lowest one alone.
 
-    def _polygon_to_coords(self, poly : object):
-        """Test if shape is an object of type Polygon, if it is, convert it
+        Returns:
+            Tuple(int, int): lowest point out of all lines, None if there is no valid point, or a list of up to count lowest ones
+        """
+
+        if polygon is None:
+            points = []
+            for line in lines:
+                points.append(self._lowest_point(line))
+
+            return self._lowest_point(points)
+
+        points = np.array([p for line in lines for p in line], dtype=float).reshape(-1, 2)
+        if band is not None:
+            points = points[(points[:, 1] >= band[0]) & (points[:, 1] <= band[1])]
+        if count is not None:
+            # lines share their end points
+            points = np.unique(points, axis=0)
+        points = points[np.lexsort((points[:, 0], points[:, 1]))]
+
+        # skip points inside NFPs of shapes that were left out of the union,
+        # tested in growing chunks from the lowest point
+        retired = self._frontier.retired(polygon)
+        near = self._near(polygon, band)
+        if near is not None:
+            retired = np.intersect1d(retired, near, assume_unique=True)
+        found = []
+        start, size = 0, 16
+        while start < len(points):
+            chunk = points[start:start + size]
+            if len(retired):
+                chunk = chunk[~self._nfp.inside(chunk, polygon, retired)]
+            if count is None and len(chunk):
+                return tuple(chunk[0])
+            if count is not None:
+                found.extend(map(tuple, chunk[:count - len(found)].tolist()))
+                if len(found) == count:
+                    return found
+            start, size = start + size, size * 2
+
+        return None if count is None else found
+
+
+    def _feasible_placements(self, polygon : Polygon, band : Tuple = None):
+        """Finds lines along which the shape can be placed. A line is where a shape can be placed by
+        its highest point so that it touches another shape/the edge of the circle
+
+        An inner-fit polygon(IFP) for the shape and the circle 
+        and a no-fit polygon(NFP) for the shape and all currently placed shapes
+        are found, then boundary rings of the NFP are clipped to the IFP.
+        Vertices of the NFP inside the IFP are valid placements
 
         Args:
-            poly (object): shape object
+            polygon (Polygon): shape to find placement lines
+            band (Tuple(float, float), optional): bottom and top of heights the lines are searched in, only shapes
+                reaching into it are part of the NFP, so lines outside of it are not valid. Defaults to None, the whole circle.
 
         Returns:
-            list of coords: list of vertices of shape
+            List(List(Tuple(int, int))): List of lines. A line consists of points representing vertices
         """
 
-        if isinstance(poly, Polygon):
-            return list(poly.exterior.coords)
-        
-        return poly
-        
+        ifp = self._inner_fit_circle(polygon)
+
+        # shape does not fit into the circle
+        if ifp.is_empty:
+            return []
 
+        # if no shape has been placed yet
+        if not self._sg._shapes:
+            return [self._polygon_to_coords(ifp)]
 
-    def _minkowski_difference(self, polygonA : Polygon, polygonB : Polygon):
-        """NFP of two shapes, shape A is already placed,
-        shape B to be placed
-        Take edges of both polygons as vectors, order them in asc. order by angle to x-axis
-        Construct NFP by placing the vectors in order behind each other
+        # get NFP
+        nfp = self._no_fit_polygons(polygon, band)
+
+        # parts of the NFP boundary inside the IFP
+        with self._stats.phase('clip'):
+            return boundary_lines(nfp, ifp)
+
+    def _no_fit_polygons(self, polygon : Polygon, band : Tuple = None):
+        """Compute no fit polygon of a new shape and all placed shapes
+        by computing no fit polygons for all placed shapes and a new shape
+        and then taking their union
 
         Args:
-            polygonA (Polygon): already placed shape
-            polygonB (Polygon): shape to be placed
+            polygon (Polygon): new shape
+            band (Tuple(float, float), optional): bottom and top of heights the NFP is needed in,
+                only shapes reaching into it are used. Defaults to None, all shapes.
 
         Returns:
-            list((int, int)): no fit polygon of pA, pB]
+            Polygon: no fit polygon
         """
 
-        polygonA, polygonB = polygonA.convex_hull, polygonB.convex_hull
-        polygonA, polygonB = self._orient_shapes(polygonA, polygonB)
-
-        vectorsA, vectorsB = self._points_to_edges(polygonA), self._points_to_edges(polygonB)
+        self._cache_placed_shapes()
+
+        # shapes enclosed by other shapes and the circle cannot be touched
+        with self._stats.phase('nfp'):
+            active = self._frontier.active(polygon)
+            near = self._near(polygon, band)
+            if near is not None:
+                active = np.intersect1d(active, near, assume_unique=True)
+            polygons = self._nfp.polygons(polygon, active)
+        if self._interrupted is not None and self._interrupted():
+            # nothing is placed from an abandoned evaluation, skip the union
+            return Polygon()
+        # counts are not computed when nothing is collected
+        if self._stats.enabled:
+            self._stats.count('nfp_vertices', shapely.get_num_coordinates(polygons).sum())
+        with self._stats.phase('union'):
+            nfp = unary_union(polygons)
+        if self._stats.enabled:
+            self._stats.count('union_pieces', shapely.get_num_geometries(nfp))
+        return nfp
 
-        angles = self._get_angles(vectorsA + vectorsB)
 
-        nfp = [(0,0)]
+    def _rollback(self, placed : int, count : int, cut : int):
+        """Drops shapes placed past the given counts and rebuilds the structures derived from placed shapes,
+        some of which may have taken a shape that failed part way
 
-        for x in range(0,len(angles)-1):
-            nfp.append((nfp[x][0] + angles[x][0][0], nfp[x][1] + angles[x][0][1]))
+        Args:
+            placed (int): number of shapes of the generator to keep
+            count (int): count of placed shapes to go back to
+            cut (int): number of indices of shapes cut short to keep
+        """
 
-        nfp.append((0,0))
+        stored = len(self._sg._shapes) > placed
+        self._sg.rollback(placed)
+        self._count = count
+        del self._cut_short[cut:]
+        if not stored:
+            # the derived structures take shapes only once they are stored
+            return
+        self._nfp = NFPEngine(cache_size=self._nfp_cache, tolerance=self._nfp_tolerance)
+        self._frontier = Frontier(self._sg._radius)
+        self._grid = OccupancyGrid(self._sg._radius, self._grid_cells) if self._grid_cells else None
+        self._cache_placed_shapes()
+
+
+    def _cache_placed_shapes(self):
+        """Adds shapes placed since the last call to the NFP engine and the frontier,
+        so that their geometry is not recomputed for every new shape
+        """
 
-        return nfp
+        shapes = self._sg._shapes
+        # the grid is not part of checkpoints, it catches up on its own
+        grid = len(shapes) if self._grid is None else len(self._grid)
+        if len(self._nfp) == grid == len(shapes):
+            return
+        with self._stats.phase('cache'):
+            for i in range(len(self._nfp), len(shapes)):
+                shape = shapes.vertices(i)
+                self._nfp.add(shape)
+                self._frontier.add(shape)
+            for i in range(grid, len(shapes)):
+                self._grid.add(shapes.vertices(i))
 
 
-    def _orient_shapes(self, polygonA : Polygon, polygonB=None ):
-        """Orient both polygons correctly, A counter-clockwise, B clockwise
+    def _near(self, polygon : Polygon, band : Tuple = None):
+        """Placed shapes whose NFPs with a new shape reach into a band of heights
 
         Args:
-            polygonA (Polygon): shape to have its coords ordered counter-clockwise
-            polygonB (Polygon, optional): shape to have its coords ordered clockwise. Defaults to None.
+            polygon (Polygon): new shape
+            band (Tuple(float, float), optional): bottom and top of the band. Defaults to None, the whole circle.
 
         Returns:
-            Polygon, Polygon: the first has vertices ordered ccw, latter cw
+            np.ndarray: sorted indices of the shapes, None for all shapes
         """
 
-        if not LinearRing(list(polygonA.exterior.coords)).is_ccw:
-            polygonA = Polygon((list(polygonA.exterior.coords)[::-1])[:-1])
-        if polygonB is not None and LinearRing(list(polygonB.exterior.coords)).is_ccw:
-            polygonB = Polygon((list(polygonB.exterior.coords)[::-1])[:-1])
-        
-        return polygonA, polygonB
+        if band is None:
+            return None
+        return self._grid.near(band[0], band[1], polygon.bounds[3] - polygon.bounds[1])
 
 
-    def _points_to_edges(self, polygon : Polygon):
-        """Point representation to vector representation of shape
+    def _inner_fit_circle(self, polygon : Polygon):
+        """ Inner fit polygon for circle and a shape to be placed.
+            The shape is placed by its highest point, the IFP is constructed
+            analytically as an intersection of circles and memoized for the shape's orientation
 
         Args:
-            polygon (Polygon): shape
+            polygon (Polygon): input shape to make IFP
 
         Returns:
-            list((int, int)): List of edges of shape as vectors
+            Polygon: IFP
         """
 
-        polygon = self._polygon_to_coords(polygon)
-        vectors = []
-        for i in range(0, len(polygon)-1):
-            vectors.append((polygon[i+1][0] - polygon[i][0], polygon[i+1][1] - polygon[i][1]))
-        
-        return vectors
+        with self._stats.phase('ifp'):
+            return self._ifp.inner_fit(polygon, self._highest_point(polygon))
 
 
-    def _get_angles(self, polygon_vectors : List):
-        """Get angles relative to positive x-axis, sort ascending by angle
+    def _highest_point(self, poly : Polygon):
+        """ Finds highest, eventually the highest point which is also the rightest
 
         Args:
-            polygon_vectors (List(Tuple(int, int))): List of vectors representing edges of shapes
+            poly Polygon: Shape
 
         Returns:
-            list((int, int)): Ordered list of vectors by their angles to the x-axis, in asc. order
+            (int, int): Highest point of shape
         """
 
-        angles = []
-        for vector in polygon_vectors:
-            angles.append([vector, self._angle_x(vector)])
-        return sorted(angles, key=lambda x: x[1])
+        coords = self._polygon_to_coords(poly)
+
+        point = coords[0]
+
+        for p in coords:
+            if p[1] > point[1]:
+                point = p
+            elif p[1] == point[1]:
+                if p[0] > point[0]:
+                    point = p
+        
+        return point
 
 
-    def _angle_x(self, vector : Tuple):
-        """Get angle rel. to x-axis
+    def _lowest_point(self, poly : Polygon):
+        """ Finds lowest, eventually the lowest point which is also the leftest
 
         Args:
-            vector ((int, int)): vector
+            poly Polygon: Shape
 
         Returns:
-            int: Angle of vector to positive x-axis
+            (int, int): Lowest point of shape
         """
 
-        angle = 0
-        if vector[0] == 0:
-            if vector[1] > 0:
-                return math.pi/2
-            return 3/2*math.pi
-        else:
-            angle = math.atan(vector[1]/vector[0])
+        coords = self._polygon_to_coords(poly)
 
-        if vector[0] < 0:
-            angle += math.pi
+        point = coords[0]
 
-        if angle < 0:
-            angle += 2*math.pi
-        return angle
+        for p in coords:
+            if p[1] < point[1]:
+                point = p
+            elif p[1] == point[1]:
+                if p[0] < point[0]:
+                    point = p
+        
+        return point
+
+
+    def _polygon_to_coords(self, poly : object):
+        """Test if shape is an object of type Polygon, if it is, convert it
+
+        Args:
+            poly (object): shape object
+
+        Returns:
+            list of coords: list of vertices of shape
+        """
+
+        if isinstance(poly, Polygon):
+            return list(poly.exterior.coords)
+        if isinstance(poly, MultiPolygon):
+            return [coord for part in poly.geoms for coord in part.exterior.coords]
+        
+        return poly
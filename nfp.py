@@ -0,0 +1,393 @@
+from collections import OrderedDict
+from copy import copy
+
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+from shapely.geometry.polygon import orient
+
+
+# largest tolerance of hull comparison. A cached NFP is built from the hulls that first got its key, every
+# one of its vertices sums up to k+m edges that may each be off by the tolerance, which has to stay far below
+# the overlap accepted by the shape generator(1e-7) for hulls of up to about a hundred vertices
+MAX_TOLERANCE = 1e-9
+
+
+class NFPEngine(object):
+    """No-fit polygons(NFP) of all placed shapes and a new shape, computed in one vectorized pass.
+
+    Convex hulls of placed shapes are stored as a single (N, k, 2) array of edge vectors,
+    sorted by their angle to the x-axis. Hulls with fewer than k vertices are padded
+    with zero-length edges which do not change the resulting NFP.
+
+    An NFP relative to the anchor of the placed shape depends only on the edges of both hulls,
+    which are the same for repeated shapes in the same orientation. Placed hulls whose edges are
+    the same up to a tolerance share a type, NFPs relative to anchors are cached by the edges
+    of the new hull(so by its shape and rotation) and the type of the placed hull. Only types
+    missing from the cache are computed, the least recently used new hulls are dropped first.
+
+    Forks share the arrays, see fork(). They also share the types and the cache, which only grow.
+    """
+
+    def __init__(self, capacity : int = 64, cache_size : int = 256, tolerance : float = 1e-9):
+        """Constructor
+
+        Args:
+            capacity (int, optional): initial number of shapes the arrays can hold. Defaults to 64.
+            cache_size (int, optional): number of new hulls whose NFPs are cached, 0 disables the cache. Defaults to 256.
+            tolerance (float, optional): edges of hulls are quantized to it before they are compared,
+                at most MAX_TOLERANCE. Defaults to 1e-9.
+        """
+
+        if not 0 < tolerance <= MAX_TOLERANCE:
+            raise ValueError(f"NFP tolerance has to be positive and at most {MAX_TOLERANCE}, got {tolerance!r}")
+        self._count = 0
+        self._k = 0
+        self._edges = np.zeros((capacity, 0, 2))
+        self._angles = np.zeros((capacity, 0))
+        self._anchors = np.zeros((capacity, 2))
+        # number of rows written to the arrays, shared by forks
+        self._tip = [0]
+
+        # type of every placed hull, types by quantized edges and sorted edges and angles of every type
+        self._types = np.zeros(capacity, dtype=np.int64)
+        self._type_ids = {}
+        self._type_edges = []
+        # relative NFPs of types and which of them are known, by k and quantized edges of the new hull
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._tolerance = tolerance
+        self._hits = 0
+        self._misses = 0
+
+
+    def __len__(self):
+        return self._count
+
+
+    def __getstate__(self):
+        # cached NFPs are recomputed when needed, they are not part of checkpoints
+        state = self.__dict__.copy()
+        state['_cache'] = OrderedDict()
+        return state
+
+
+    def cache_info(self):
+        """Counters of the NFP cache
+
+        Returns:
+            dict: NFPs of placed shapes taken from the cache(hits) and computed(misses), number of cached new hulls,
+                the limit and number of types of placed hulls
+        """
+
+        return {'hits': self._hits, 'misses': self._misses, 'size': len(self._cache), 'maxsize': self._cache_size,
+                'types': len(self._type_edges)}
+
+
+    def fork(self):
+        """Copy sharing the arrays, in O(1). Rows below the count of an engine never change, the engine
+        whose count is the number of written rows appends in place and the others copy the arrays first,
+        so forks never see each other's shapes
+
+        Returns:
+            NFPEngine: engine with the same placed shapes
+        """
+
+        return copy(self)
+
+
+    @property
+    def anchors(self):
+        """Lowest points of placed shapes, NFPs are fitted to them
+
+        Returns:
+            np.ndarray: (N, 2) array of points
+        """
+
+        return self._anchors[:self._count]
+
+
+    def add(self, shape):
+        """Adds a placed shape. Its hull edges and lowest point are computed only once here.
+
+        Args:
+            shape (List(List(int, int))): vertices of a placed shape
+        """
+
+        edges = hull_edges(Polygon(shape), ccw=True)
+        angles = edge_angles(edges)
+        order = np.argsort(angles, kind='stable')
+
+        if self._tip[0] != self._count:
+            # a fork added shapes after this engine, its rows are kept
+            self._grow(len(self._anchors), self._k)
+        if self._count == len(self._anchors):
+            self._grow(2 * len(self._anchors), self._k)
+        if len(edges) > self._k:
+            self._grow(len(self._anchors), len(edges))
+
+        pad = self._k - len(edges)
+        self._edges[self._count] = 0
+        self._edges[self._count, pad:] = edges[order]
+        # padding goes first in the sorted order
+        self._angles[self._count] = -1
+        self._angles[self._count, pad:] = angles[order]
+        self._anchors[self._count] = min(shape, key=lambda p: (p[1], p[0]))
+
+        key = self._key(edges[order])
+        if key not in self._type_ids:
+            self._type_ids[key] = len(self._type_edges)
+            self._type_edges.append((edges[order], angles[order]))
+        self._types[self._count] = self._type_ids[key]
+        self._count += 1
+        self._tip[0] = self._count
+
+
+    def no_fit_polygons(self, polygon : Polygon, indices : np.ndarray = None):
+        """Vertices of NFPs of placed shapes and a new shape.
+        Edges of both hulls are merged by their angles and placed behind each other,
+        the resulting NFP starts in the lowest point of the placed shape
+
+        Args:
+            polygon (Polygon): new shape
+            indices (np.ndarray, optional): placed shapes to use. Defaults to None, all placed shapes.
+
+        Returns:
+            np.ndarray: (N, k+m, 2) array, vertices of N no fit polygons
+        """
+
+        if indices is None:
+            indices = slice(0, self._count)
+        anchors = self._anchors[indices]
+
+        edges = hull_edges(polygon, ccw=False)
+        angles = edge_angles(edges)
+        if not self._cache_size:
+            return self._relative(self._edges[indices], self._angles[indices], edges, angles) + anchors[:, None, :]
+
+        # relative NFPs of the types known for the new hull, types grow as hulls are placed
+        key = (self._k, self._key(edges[np.argsort(angles, kind='stable')]))
+        count = len(self._type_edges)
+        relative, known = self._cache.pop(key, (np.zeros((0, self._k + len(edges), 2)), np.zeros(0, dtype=bool)))
+        if len(known) < count:
+            relative = np.concatenate((relative, np.zeros((count - len(known),) + relative.shape[1:])))
+            known = np.concatenate((known, np.zeros(count - len(known), dtype=bool)))
+
+        types = self._types[indices]
+        missing = np.unique(types)
+        missing = missing[~known[missing]]
+        if len(missing):
+            # hulls of the types padded to k edges, padding goes first
+            placed_edges = np.zeros((len(missing), self._k, 2))
+            placed_angles = np.full((len(missing), self._k), -1.0)
+            for i, t in enumerate(missing):
+                type_edges, type_angles = self._type_edges[t]
+                placed_edges[i, self._k - len(type_edges):] = type_edges
+                placed_angles[i, self._k - len(type_angles):] = type_angles
+            relative[missing] = self._relative(placed_edges, placed_angles, edges, angles)
+            known[missing] = True
+        self._misses += len(missing)
+        self._hits += len(types) - len(missing)
+
+        self._cache[key] = (relative, known)
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return relative[types] + anchors[:, None, :]
+
+
+    def polygons(self, polygon : Polygon, indices : np.ndarray = None):
+        """NFPs of placed shapes and a new shape as polygons, ready to be merged
+
+        Args:
+            polygon (Polygon): new shape
+            indices (np.ndarray, optional): placed shapes to use. Defaults to None, all placed shapes.
+
+        Returns:
+            np.ndarray: array of N NFP polygons
+        """
+
+        return shapely.polygons(self.no_fit_polygons(polygon, indices))
+
+
+    def inside(self, points : np.ndarray, polygon : Polygon, indices : np.ndarray = None, tolerance : float = 1e-9):
+        """Tests which points lie inside some NFP, i.e. the new shape placed there would overlap a placed shape.
+        NFPs are convex with ccw vertices, so a point is inside if it lies to the left of all edges.
+
+        Args:
+            points (np.ndarray): (P, 2) array of points
+            polygon (Polygon): new shape
+            indices (np.ndarray, optional): placed shapes to use. Defaults to None, all placed shapes.
+            tolerance (float, optional): distance from the NFP boundary under which a point is considered outside. Defaults to 1e-9.
+
+        Returns:
+            np.ndarray: (P,) boolean array, True for points inside an NFP
+        """
+
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        vertices = self.no_fit_polygons(polygon, indices)
+        if not len(vertices) or not len(points):
+            return np.zeros(len(points), dtype=bool)
+
+        # only pairs of points and NFPs with overlapping bounding boxes are tested
+        lower, upper = vertices.min(axis=1), vertices.max(axis=1)
+        pairs = ((points[:, None, :] > lower[None] + tolerance) & (points[:, None, :] < upper[None] - tolerance)).all(axis=2)
+        p, n = np.nonzero(pairs)
+
+        inside = np.zeros(len(points), dtype=bool)
+        inside[p[inside_pairs(points, vertices, p, n, tolerance)]] = True
+        return inside
+
+
+    def _relative(self, placed_edges : np.ndarray, placed_angles : np.ndarray, edges : np.ndarray, angles : np.ndarray):
+        """Vertices of NFPs of placed hulls and a new hull relative to anchors of the placed hulls
+
+        Args:
+            placed_edges (np.ndarray): (N, k, 2) edges of placed hulls sorted by their angles
+            placed_angles (np.ndarray): (N, k) angles of the edges
+            edges (np.ndarray): (m, 2) edges of the new hull, clockwise
+            angles (np.ndarray): (m,) angles of the edges
+
+        Returns:
+            np.ndarray: (N, k+m, 2) array, vertices of N no fit polygons
+        """
+
+        n, m = len(placed_edges), len(edges)
+        edges = np.concatenate((placed_edges, np.broadcast_to(edges, (n, m, 2))), axis=1)
+        angles = np.concatenate((placed_angles, np.broadcast_to(angles, (n, m))), axis=1)
+
+        # stable sort keeps edges of the placed shape first if angles are equal
+        order = np.argsort(angles, axis=1, kind='stable')
+        edges = np.take_along_axis(edges, order[:, :, None], axis=1)
+
+        vertices = np.zeros(edges.shape)
+        np.cumsum(edges[:, :-1], axis=1, out=vertices[:, 1:])
+        return vertices
+
+
+    def _key(self, edges : np.ndarray):
+        """Key of a hull given by its edges sorted by their angles, which is the same for hulls
+        that are the same up to translation and the tolerance
+
+        Args:
+            edges (np.ndarray): (k, 2) array of edge vectors
+
+        Returns:
+            Tuple(int): quantized edges
+        """
+
+        return tuple(np.round(edges / self._tolerance).astype(np.int64).ravel().tolist())
+
+
+    def _grow(self, capacity : int, k : int):
+        """Reallocates arrays to hold more shapes or hulls with more vertices
+
+        Args:
+            capacity (int): number of shapes
+            k (int): number of hull edges
+        """
+
+        pad = k - self._k
+        edges = np.zeros((capacity, k, 2))
+        angles = np.full((capacity, k), -1.0)
+        anchors = np.zeros((capacity, 2))
+        types = np.zeros(capacity, dtype=np.int64)
+        edges[:self._count, pad:] = self._edges[:self._count]
+        angles[:self._count, pad:] = self._angles[:self._count]
+        anchors[:self._count] = self._anchors[:self._count]
+        types[:self._count] = self._types[:self._count]
+        self._edges, self._angles, self._anchors, self._types = edges, angles, anchors, types
+        self._tip = [self._count]
+        self._k = k
+
+
+def hull_edges(polygon : Polygon, ccw : bool = True):
+    """Edges of the convex hull of a shape as vectors
+
+    Args:
+        polygon (Polygon): shape
+        ccw (bool, optional): orientation of the hull. Defaults to True.
+
+    Returns:
+        np.ndarray: (k, 2) array of edge vectors
+    """
+
+    hull = orient(polygon.convex_hull, 1.0 if ccw else -1.0)
+    return np.diff(np.asarray(hull.exterior.coords), axis=0)
+
+
+def edge_angles(edges : np.ndarray):
+    """Angles of vectors relative to positive x-axis, in range [0, 2pi)
+
+    Args:
+        edges (np.ndarray): (..., 2) array of vectors
+
+    Returns:
+        np.ndarray: angles of vectors
+    """
+
+    angles = np.arctan2(edges[..., 1], edges[..., 0])
+    return np.where(angles < 0, angles + 2*np.pi, angles)
+
+
+def inside_pairs(points : np.ndarray, vertices : np.ndarray, p : np.ndarray, n : np.ndarray, tolerance : float = 1e-9):
+    """Tests pairs of points and convex ccw polygons(NFPs) if the point lies inside the polygon,
+    i.e. to the left of all its edges
+
+    Args:
+        points (np.ndarray): (P, 2) array of points
+        vertices (np.ndarray): (N, k, 2) array of polygon vertices
+        p (np.ndarray): (M,) indices of points
+        n (np.ndarray): (M,) indices of polygons
+        tolerance (float, optional): distance from the boundary under which a point is considered outside. Defaults to 1e-9.
+
+    Returns:
+        np.ndarray: (M,) boolean array, True for pairs where the point is inside
+    """
+
+    vertices = vertices[n]
+    edges = np.roll(vertices, -1, axis=1) - vertices
+    lengths = np.hypot(edges[..., 0], edges[..., 1])
+    # signed distances of points from edges, positive to the left
+    offsets = points[p, None, :] - vertices
+    cross = edges[..., 0] * offsets[..., 1] - edges[..., 1] * offsets[..., 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        distances = np.where(lengths > 0, cross / lengths, np.inf)
+    return (distances > tolerance).all(axis=1)
+
+
+def boundary_lines(nfp : Polygon, ifp : Polygon):
+    """Clips boundary rings(exteriors and interiors) of an NFP to an IFP. Vertices of the rings
+    are tested against the prepared IFP in one pass, consecutive vertices inside of it form a line.
+
+    Args:
+        nfp (Polygon): NFP, Polygon or MultiPolygon
+        ifp (Polygon): IFP
+
+    Returns:
+        List(List(Tuple(int, int))): List of lines. A line consists of NFP vertices inside the IFP
+    """
+
+    rings = shapely.get_rings(shapely.get_parts(nfp))
+    coords, index = shapely.get_coordinates(rings, return_index=True)
+    shapely.prepare(ifp)
+    inside = shapely.intersects_xy(ifp, coords[:, 0], coords[:, 1])
+
+    ends = np.cumsum(np.bincount(index, minlength=len(rings)))
+    starts = np.concatenate(([0], ends[:-1]))
+
+    lines = []
+    for start, end in zip(starts, ends):
+        # closing vertex repeats the first one
+        ring, kept = coords[start:end - 1], inside[start:end - 1]
+        if kept.all():
+            lines.append(list(map(tuple, coords[start:end].tolist())))
+            continue
+        # start the ring after an outside vertex, so that no line wraps around its end
+        shift = np.argmin(kept)
+        ring, kept = np.roll(ring, -shift, axis=0), np.roll(kept, -shift)
+        runs = np.split(np.arange(len(ring)), np.nonzero(~kept)[0])
+        for run in runs:
+            run = run[kept[run]]
+            if len(run):
+                lines.append(list(map(tuple, ring[run].tolist())))
+    return lines
@@ -0,0 +1,286 @@
+from copy import copy
+import math
+
+import numpy as np
+from shapely.geometry import Polygon
+from shapely.geometry.polygon import orient
+
+
+class OccupancyGrid(object):
+    """Rasterized occupancy of the circle, a coarse and conservative view of the free space.
+
+    Placements are searched with NFPs of convex hulls, so hulls stand for the shapes here as well.
+    A cell is full if it lies entirely inside the hull of a placed shape or outside the circle. For a new
+    shape, its core(cell offsets covered by its hull wherever its reference point lies within a cell) is
+    slid over the grid, a reference cell is blocked if the core hits a full cell. No placement lies in
+    a blocked cell, so the lowest free row bounds placements from below and a shape without a free cell
+    cannot be placed at all. A box lies inside a hull if its corners do, cells and cores are found by
+    testing a lattice of cell corners against the hull.
+
+    Forks share the arrays until one of them adds a shape, see fork().
+    """
+
+    def __init__(self, radius : float, cells : int = 256, capacity : int = 64):
+        """Constructor
+
+        Args:
+            radius (float): radius of the circle
+            cells (int, optional): number of cells across the diameter. Defaults to 256.
+            capacity (int, optional): initial number of shapes the bounds array can hold. Defaults to 64.
+        """
+
+        self._radius = radius
+        self._cells = cells
+        self._size = 2 * radius / cells
+        self._count = 0
+        # y-range of every placed shape
+        self._bounds = np.zeros((capacity, 2))
+
+        # cells outside of the grid are outside of the circle, the grid is padded by them
+        # so that cores of shapes up to the size of the circle can be slid over it
+        self._pad = cells // 2
+        self._padded = np.ones((cells + 2 * self._pad, cells + 2 * self._pad), dtype=bool)
+        self._full = self._padded[self._pad:self._pad + cells, self._pad:self._pad + cells]
+        # distance of the nearest point of every cell to the center along each axis, rows are y, columns are x
+        edges = -radius + np.arange(cells + 1) * self._size
+        near = np.where(edges[:-1] > 0, edges[:-1], np.where(edges[1:] < 0, edges[1:], 0))
+        self._full[:] = near[:, None]**2 + near[None, :]**2 >= radius**2
+        # cells inside the circle, never changes
+        self._inside = ~self._full
+        # full cells of the padded grid counted along rows and the longest run of cells that are not full in every row
+        self._counts = np.zeros((len(self._padded), len(self._padded) + 1), dtype=np.int32)
+        self._longest = np.zeros(len(self._padded), dtype=np.int32)
+        self._update(0, cells)
+        # number of grids sharing the arrays, shared by them
+        self._sharers = [1]
+
+
+    def __len__(self):
+        return self._count
+
+
+    @property
+    def cell_size(self):
+        """Side of a cell
+
+        Returns:
+            float: side of a cell
+        """
+
+        return self._size
+
+
+    def fork(self):
+        """Copy sharing the arrays, in O(1). Cells change in place when a shape is added, so a grid
+        copies the arrays before it adds one while other grids share them, the last one changes them in place.
+        A grid that is dropped without adding a shape still counts, the last one then copies as well
+
+        Returns:
+            OccupancyGrid: grid with the same placed shapes
+        """
+
+        self._sharers[0] += 1
+        return copy(self)
+
+
+    def add(self, shape):
+        """Adds a placed shape, cells inside of it become full
+
+        Args:
+            shape (List(List(int, int))): vertices of a placed shape
+        """
+
+        polygon = Polygon(shape)
+        minx, miny, maxx, maxy = polygon.bounds
+
+        if self._sharers[0] > 1:
+            self._sharers[0] -= 1
+            self._padded, self._counts, self._longest = self._padded.copy(), self._counts.copy(), self._longest.copy()
+            self._full = self._padded[self._pad:self._pad + self._cells, self._pad:self._pad + self._cells]
+            self._bounds = self._bounds.copy()
+            self._sharers = [1]
+        if self._count == len(self._bounds):
+            bounds = np.zeros((2 * len(self._bounds), 2))
+            bounds[:self._count] = self._bounds
+            self._bounds = bounds
+        self._bounds[self._count] = (miny, maxy)
+        self._count += 1
+
+        c0, r0 = (max(0, math.floor((v + self._radius) / self._size)) for v in (minx, miny))
+        c1, r1 = (min(self._cells, math.ceil((v + self._radius) / self._size)) for v in (maxx, maxy))
+        if c0 >= c1 or r0 >= r1:
+            return
+        # corners of the cells, a cell is inside the hull if its four corners are
+        corners = in_hull(polygon, -self._radius + np.arange(c0, c1 + 1) * self._size,
+                          -self._radius + np.arange(r0, r1 + 1) * self._size)
+        self._full[r0:r1, c0:c1] |= corners[:-1, :-1] & corners[:-1, 1:] & corners[1:, :-1] & corners[1:, 1:]
+
+        self._update(r0, r1)
+
+
+    def near(self, low : float, high : float, height : float):
+        """Placed shapes whose NFPs with a new shape reach into a band of reference points
+
+        Args:
+            low (float): bottom of the band
+            high (float): top of the band
+            height (float): height of the new shape, placed by its highest point
+
+        Returns:
+            np.ndarray: sorted indices of the shapes
+        """
+
+        bounds = self._bounds[:self._count]
+        return np.flatnonzero((bounds[:, 0] <= high) & (bounds[:, 1] + height >= low))
+
+
+    def gap(self, polygon : Polygon):
+        """Free area a placed shape would leave under itself: in every column of cells it spans,
+        the cells between the highest cell filled by placed shapes(or the bottom of the circle)
+        and the bottom of the shape's hull
+
+        Args:
+            polygon (Polygon): shape at its placement
+
+        Returns:
+            float: area of the free cells
+        """
+
+        h, n = self._size, self._cells
+        minx, miny, maxx, maxy = polygon.bounds
+        c0, c1 = max(0, math.floor((minx + self._radius) / h)), min(n, math.ceil((maxx + self._radius) / h))
+        if c0 >= c1:
+            return 0.0
+
+        inside = self._inside[:, c0:c1]
+        placed = self._full[:, c0:c1] & inside
+        # first row above placed cells of every column, the lowest row inside the circle if there are none
+        skyline = np.where(placed.any(axis=0), n - np.argmax(placed[::-1], axis=0), np.argmax(inside, axis=0))
+
+        # bottom of the hull at centers of the columns, from its edges crossing them
+        x = -self._radius + (np.arange(c0, c1) + 0.5) * h
+        vertices = np.asarray(polygon.convex_hull.exterior.coords)
+        (ax, ay), (bx, by) = vertices[:-1].T, vertices[1:].T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            y = ay[:, None] + (x[None, :] - ax[:, None]) * ((by - ay) / (bx - ax))[:, None]
+        crossing = (np.minimum(ax, bx)[:, None] <= x[None, :]) & (x[None, :] <= np.maximum(ax, bx)[:, None]) & (ax != bx)[:, None]
+        bottom = np.where(crossing, y, np.inf).min(axis=0)
+        spanned = bottom < np.inf
+
+        rows = np.floor((bottom[spanned] + self._radius) / h)
+        return float(np.maximum(0, rows - skyline[spanned]).sum() * h * h)
+
+
+    def lower_bound(self, polygon : Polygon, reference : tuple, rows : int = 16):
+        """Lowest height where the reference point of a new shape can be placed. Rows of reference
+        cells are scanned from the bottom in blocks, the scan stops at the first block with a free cell
+
+        Args:
+            polygon (Polygon): new shape
+            reference (Tuple(int, int)): point the shape is placed by
+            rows (int, optional): number of rows in a block. Defaults to 16.
+
+        Returns:
+            float: no placement of the reference point is lower, -inf if the shape is too small or too large for a core,
+                None if the shape cannot be placed anywhere
+        """
+
+        runs = self._core(polygon, reference)
+        if not runs:
+            return -math.inf
+
+        n, pad = self._cells, self._pad
+        # a row of reference cells can have a free cell only if every run of the core fits into its row
+        candidates = np.ones(n, dtype=bool)
+        for dy, x0, x1 in runs:
+            candidates &= self._longest[pad + dy:pad + dy + n] > x1 - x0
+        candidates = np.flatnonzero(candidates)
+
+        for start in range(0, len(candidates), rows):
+            block = candidates[start:start + rows]
+            blocked = np.zeros((len(block), n), dtype=bool)
+            for dy, x0, x1 in runs:
+                # a reference cell is blocked if the run of the core covers a full cell
+                row = self._counts[pad + dy + block]
+                blocked |= row[:, pad + x1 + 1:pad + x1 + 1 + n] > row[:, pad + x0:pad + x0 + n]
+            free = np.flatnonzero(~blocked.all(axis=1))
+            if len(free):
+                return -self._radius + block[free[0]] * self._size
+        return None
+
+
+    def _update(self, r0 : int, r1 : int):
+        """Recounts full cells and the longest runs of cells that are not full in rows of the grid
+
+        Args:
+            r0 (int): first row
+            r1 (int): row after the last one
+        """
+
+        rows = slice(self._pad + r0, self._pad + r1)
+        full = self._padded[rows]
+        np.cumsum(full, axis=1, out=self._counts[rows, 1:])
+        # distance of every cell from the last full cell in its row
+        columns = np.arange(full.shape[1])
+        last = np.maximum.accumulate(np.where(full, columns, -1), axis=1)
+        self._longest[rows] = (columns - last).max(axis=1)
+
+
+    def _core(self, polygon : Polygon, reference : tuple):
+        """Cell offsets from the reference cell covered by the hull of a shape wherever its reference point
+        lies within the reference cell, i.e. offsets d whose box d*size +- size lies inside the hull.
+        The hull is convex, so the offsets of a row form a single run
+
+        Args:
+            polygon (Polygon): new shape
+            reference (Tuple(int, int)): point the shape is placed by
+
+        Returns:
+            List(Tuple(int, int, int)): runs of offsets, row offset and the first and last column offset,
+                empty if the offsets could be larger than the padding of the grid
+        """
+
+        h = self._size
+        minx, miny, maxx, maxy = polygon.bounds
+        left, right = math.ceil((minx - reference[0]) / h), math.floor((maxx - reference[0]) / h)
+        bottom, top = math.ceil((miny - reference[1]) / h), math.floor((maxy - reference[1]) / h)
+        if right - left < 2 or top - bottom < 2:
+            return []
+        # offsets lie strictly inside the lattice, a shape reaching past the padding is not tested at all
+        if max(abs(left + 1), abs(right - 1), abs(bottom + 1), abs(top - 1)) > self._pad:
+            return []
+
+        # lattice of corners of cells around the reference point, boxes of offsets are spanned by two cells of it
+        kx = np.arange(left, right + 1)
+        ky = np.arange(bottom, top + 1)
+
+        corners = in_hull(polygon, reference[0] + kx * h, reference[1] + ky * h)
+        core = corners[:-2, :-2] & corners[:-2, 2:] & corners[2:, :-2] & corners[2:, 2:]
+        rows = np.flatnonzero(core.any(axis=1))
+        if not len(rows):
+            return []
+
+        dx, dy = kx[1:-1], ky[1:-1][rows]
+        x0 = dx[np.argmax(core[rows], axis=1)]
+        x1 = dx[len(dx) - 1 - np.argmax(core[rows, ::-1], axis=1)]
+        return list(zip(dy.tolist(), x0.tolist(), x1.tolist()))
+
+
+def in_hull(polygon : Polygon, x : np.ndarray, y : np.ndarray):
+    """Tests a lattice of points against the convex hull of a shape, points on its boundary are inside
+
+    Args:
+        polygon (Polygon): shape
+        x (np.ndarray): x coordinates of columns of the lattice
+        y (np.ndarray): y coordinates of rows of the lattice
+
+    Returns:
+        np.ndarray: (len(y), len(x)) boolean array, True for points inside the hull
+    """
+
+    vertices = np.asarray(orient(polygon.convex_hull, 1.0).exterior.coords)
+    inside = np.ones((len(y), len(x)), dtype=bool)
+    for (ax, ay), (bx, by) in zip(vertices[:-1], vertices[1:]):
+        # ccw hull, inside is to the left of every edge
+        inside &= (bx - ax) * (y[:, None] - ay) - (by - ay) * (x[None, :] - ax) >= 0
+    return inside
@@ -0,0 +1,298 @@
+from collections import OrderedDict
+from functools import partial
+from typing import List
+from time import perf_counter
+import threading
+import queue
+import uuid
+
+
+# placers mirrored in a worker process, by layout key, the least recently used are dropped
+_LAYOUTS = OrderedDict()
+_MAX_LAYOUTS = 16
+# last generation of tasks abandoned by the pool, shared with the worker processes
+_ABANDONED = None
+
+# returned by a worker that does not hold the placed shapes a task was built for
+MISS = 'miss'
+# placement of an orientation that was not found before the timeout
+SKIPPED = 'skipped'
+
+
+class LayoutMirror(object):
+    """Placed shapes of a placer mirrored in worker processes.
+
+    Workers keep their own copy of the placer, so a task only ships the shapes placed since
+    the previous task. A worker whose copy is behind answers with MISS and the task is sent
+    again with all placed shapes.
+    """
+
+    def __init__(self, placer):
+        """Constructor
+
+        Args:
+            placer (MyPlacer): placer whose placed shapes are mirrored
+        """
+
+        self._placer = placer
+        self._key = uuid.uuid4().hex
+        self._synced = 0
+
+
+    def task(self, full : bool = False):
+        """Arguments identifying the placed shapes of the placer for a worker
+
+        Args:
+            full (bool, optional): ship all placed shapes instead of the new ones. Defaults to False.
+
+        Returns:
+            Tuple: layout key, settings of the placer, count of placed shapes and the shapes to append
+        """
+
+        shapes = self._placer._sg._shapes
+        start = 0 if full else self._synced
+        self._synced = len(shapes)
+        return self._key, self._placer._settings(), len(shapes), [list(map(list, s)) for s in shapes[start:]]
+
+
+class OrientationPool(object):
+    """Persistent pool of processes that find placements of orientations of a shape in parallel.
+
+    Tasks of every call of placements() are a generation. Futures cannot be cancelled once a worker
+    runs them, so when the pool stops waiting for a generation it marks it abandoned in a value shared
+    with the workers, which then stop its tasks at the next check and are free for the next shape.
+    """
+
+    def __init__(self, workers : int):
+        """Constructor
+
+        Args:
+            workers (int): number of worker processes
+        """
+
+        # process pools are imported only when they are used, to keep the placer's import light
+        from concurrent.futures import ProcessPoolExecutor
+        import multiprocessing
+
+        self._abandoned = multiprocessing.RawValue('q', 0)
+        self._generation = 0
+        self._executor = ProcessPoolExecutor(workers, initializer=_share_abandoned, initargs=(self._abandoned,))
+        self._mirrors = {}
+
+
+    def placements(self, placer, orientations : List, timeout : float = None):
+        """Lowest placement for every orientation of a shape
+
+        Args:
+            placer (MyPlacer): placer holding the placed shapes
+            orientations (List(List(Tuple(int, int)))): shape in every orientation
+            timeout (float, optional): seconds to wait for the placements. When they run out, the orientations
+                still being evaluated are SKIPPED, unless no placement was found yet. Defaults to None, no limit.
+
+        Returns:
+            List(Tuple(int, int)): lowest placement point for every orientation, None if it cannot be placed
+        """
+
+        end = None if timeout is None else perf_counter() + timeout
+        self._generation += 1
+        mirror = self._mirrors.setdefault(id(placer), LayoutMirror(placer))
+        task = mirror.task() + (self._generation,)
+        futures = {i: self._executor.submit(_orientation_placement, *task, poly) for i, poly in enumerate(orientations)}
+        points = self._collect(futures, [SKIPPED] * len(orientations), end)
+
+        missed = [i for i, p in enumerate(points) if p == MISS]
+        if missed:
+            task = mirror.task(full=True) + (self._generation,)
+            futures = {i: self._executor.submit(_orientation_placement, *task, orientations[i]) for i in missed}
+            points = self._collect(futures, points, end)
+
+        return points
+
+
+    def _collect(self, futures : dict, points : List, end : float = None):
+        """Waits for placements of orientations until the end time, or until some placement is found after it
+
+        Args:
+            futures (dict): futures of placements by the index of their orientation
+            points (List): placements of all orientations, updated in place
+            end (float, optional): perf_counter time to stop waiting at. Defaults to None, wait for all.
+
+        Returns:
+            List: the placements, SKIPPED for orientations whose futures did not finish
+        """
+
+        from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, wait
+
+        pending = set(futures.values())
+        while pending:
+            late = end is not None and perf_counter() >= end
+            if late and any(p not in (None, MISS, SKIPPED) for p in points):
+                break
+            # after the end time, wait only until some placement is found
+            timeout = None if end is None or late else end - perf_counter()
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED if late else ALL_COMPLETED)
+            for i, f in futures.items():
+                if f in done:
+                    points[i] = f.result()
+
+        if pending:
+            # queued tasks are cancelled, running ones stop themselves
+            self._abandoned.value = self._generation
+        for f in pending:
+            f.cancel()
+        for i, f in futures.items():
+            if f in pending:
+                points[i] = SKIPPED
+        return points
+
+
+    def close(self):
+        """Shuts the worker processes down"""
+
+        self._abandoned.value = self._generation
+        self._executor.shutdown()
+        self._mirrors.clear()
+
+
+class InlineExecutor(object):
+    """Executor running tasks in this process when they are submitted, stands in for a process pool without workers"""
+
+    def submit(self, function, *args):
+        from concurrent.futures import Future
+
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+    def shutdown(self):
+        pass
+
+
+def prefetch(iterable, ahead : int = 1):
+    """Iterates an iterable in a background thread, up to ahead items before they are taken,
+    so that the consumer works on an item while the next ones are computed
+
+    Args:
+        iterable (Iterable): items
+        ahead (int, optional): number of items computed in advance. Defaults to 1.
+
+    Yields:
+        items of the iterable, exceptions raised by it are raised to the consumer
+    """
+
+    done = object()
+    items = queue.Queue(maxsize=ahead)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                items.put((item, None))
+                if stop.is_set():
+                    return
+            items.put((done, None))
+        except BaseException as e:
+            items.put((done, e))
+        finally:
+            close = getattr(iterable, 'close', None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        # consumer stopped early, let the producer finish its item and return
+        stop.set()
+        while thread.is_alive():
+            try:
+                items.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        thread.join()
+
+
+def mirrored_placer(key : str, settings : dict, count : int, shapes : List):
+    """Worker side copy of a placer, brought up to date with the shipped shapes
+
+    Args:
+        key (str): layout key
+        settings (dict): radius, rotations and options of the placer
+        count (int): number of placed shapes including the shipped ones
+        shapes (List(List(List(int, int)))): shapes placed since the previous task, or all of them
+
+    Returns:
+        MyPlacer: placer holding all placed shapes, None if the worker's copy is behind
+    """
+
+    from myplacer import MyPlacer
+
+    placer = _LAYOUTS.get(key)
+    if placer is not None and len(placer._sg._shapes) == count:
+        # already received the shapes with another task
+        shapes = []
+    elif len(shapes) == count:
+        placer = _LAYOUTS[key] = MyPlacer.mirror(settings)
+        if len(_LAYOUTS) > _MAX_LAYOUTS:
+            _LAYOUTS.popitem(last=False)
+    elif placer is None or len(placer._sg._shapes) != count - len(shapes):
+        return None
+    _LAYOUTS.move_to_end(key)
+
+    placer._sg._shapes.extend(shapes)
+    placer._cache_placed_shapes()
+    return placer
+
+
+def _share_abandoned(abandoned):
+    """Keeps the generation abandoned by the pool in a worker process, initializer of the workers"""
+
+    global _ABANDONED
+    _ABANDONED = abandoned
+
+
+def _abandoned(generation : int):
+    """Whether the pool stopped waiting for tasks of a generation, checked in a worker process"""
+
+    return _ABANDONED is not None and _ABANDONED.value >= generation
+
+
+def _orientation_placement(key : str, settings : dict, count : int, shapes : List, generation : int, poly : List):
+    """Lowest placement of a shape in a single orientation, computed in a worker process.
+    The evaluation stops early once the pool abandons the generation of the task
+
+    Args:
+        key (str): layout key
+        settings (dict): radius, rotations and options of the placer
+        count (int): number of placed shapes including the shipped ones
+        shapes (List(List(List(int, int)))): shapes placed since the previous task, or all of them
+        generation (int): generation of the task
+        poly (List(Tuple(int, int))): shape in its orientation
+
+    Returns:
+        Tuple(int, int): lowest placement point, None if the shape cannot be placed, MISS if the worker is behind,
+            SKIPPED if the task was abandoned
+    """
+
+    if _abandoned(generation):
+        return SKIPPED
+    placer = mirrored_placer(key, settings, count, shapes)
+    if placer is None:
+        return MISS
+    placer._interrupted = partial(_abandoned, generation)
+    try:
+        point = placer._orientation_placement(poly)
+    finally:
+        placer._interrupted = None
+    return SKIPPED if _abandoned(generation) else point
@@ -0,0 +1,150 @@
+"""Plotting of layouts, imported only when a visualization is requested so that matplotlib stays off the import path of the placer.
+
+All placed shapes are drawn as a single collection. render_layout and FrameWriter draw on a figure
+without pyplot, so they work on machines without a display.
+"""
+
+import os
+
+import numpy as np
+from matplotlib.collections import PolyCollection
+from matplotlib.figure import Figure
+from matplotlib.patches import Circle
+import matplotlib
+import matplotlib.image
+
+
+def shape_polygons(shapes, start: int = 0):
+    """Vertices of shapes from the start index on, as arrays."""
+    if hasattr(shapes, 'vertices'):
+        return [shapes.vertices(i) for i in range(start, len(shapes))]
+    return [np.asarray(s, dtype=float) for s in shapes[start:]]
+
+
+def shape_colors(shapes, color_by: str = None, start: int = 0, scale: int = None):
+    """Face colors of shapes from the start index on.
+
+    color_by: None for a single color, 'order' to color by placement order over scale shapes
+        (all shapes by default, the colors repeat after it), 'rotation' to color by the rotation of the shape
+    """
+    count = len(shapes) - start
+    if color_by is None:
+        return ['C0'] * count
+    if color_by == 'order':
+        scale = scale or max(len(shapes), 1)
+        return matplotlib.colormaps['viridis']((np.arange(start, len(shapes)) % scale) / scale)
+    if color_by == 'rotation':
+        rotations = np.asarray(shapes.rotations[start:]) if hasattr(shapes, 'rotations') else np.zeros(count)
+        return matplotlib.colormaps['hsv']((rotations % 360) / 360)
+    raise ValueError(f"Unknown coloring {color_by}, expected None, 'order' or 'rotation'")
+
+
+def layout_axes(figure, radius: float):
+    """Axes filling the figure with the circle drawn."""
+    ax = figure.add_axes([0, 0, 1, 1])
+    ax.set_aspect(1)
+    ax.set_xlim(-radius * 1.02, radius * 1.02)
+    ax.set_ylim(-radius * 1.02, radius * 1.02)
+    ax.axis('off')
+    ax.add_patch(Circle((0, 0), radius, color='#aaa'))
+    return ax
+
+
+def add_shapes(ax, shapes, color_by: str = None, start: int = 0, scale: int = None):
+    """Add shapes from the start index on to the axes as a single collection."""
+    collection = PolyCollection(shape_polygons(shapes, start), facecolors=shape_colors(shapes, color_by, start, scale),
+                                edgecolors='k', linewidths=0.3)
+    ax.add_collection(collection, autolim=False)
+    return collection
+
+
+def render_layout(radius: float, shapes, path: str, color_by: str = None, size: float = 8, dpi: int = 100):
+    """Render the circle and the placed shapes to a file, format given by its extension (png, svg, ...)."""
+    figure = Figure(figsize=(size, size), dpi=dpi)
+    ax = layout_axes(figure, radius)
+    add_shapes(ax, shapes, color_by)
+    figure.savefig(path)
+
+
+def show_layout(radius: float, shapes, color_by: str = None):
+    """Show the circle and the placed shapes in a window."""
+    import matplotlib.pyplot as plt
+
+    f = plt.figure()
+    ax = layout_axes(f, radius)
+    add_shapes(ax, shapes, color_by)
+    plt.show()
+
+
+class FrameWriter(object):
+    """Writes a PNG snapshot of a layout every K placed shapes, for time-lapse inspection.
+
+    The canvas keeps the previous frame, only the shapes placed since then are drawn on top of it.
+    """
+
+    def __init__(self, radius: float, directory: str, every: int = 10, color_by: str = None, scale: int = 1000,
+                 size: float = 8, dpi: int = 100):
+        """Constructor
+
+        Args:
+            radius (float): radius of the circle
+            directory (str): directory frames are written to, created if missing
+            every (int, optional): number of placed shapes between frames. Defaults to 10.
+            color_by (str, optional): None, 'order' or 'rotation'. Defaults to None.
+            scale (int, optional): number of shapes the 'order' colors span. Defaults to 1000.
+            size (float, optional): size of a frame in inches. Defaults to 8.
+            dpi (int, optional): resolution of a frame. Defaults to 100.
+        """
+
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        self._directory = directory
+        self._every = every
+        self._color_by = color_by
+        self._scale = scale
+        self._drawn = 0
+        self.frames = []
+
+        os.makedirs(directory, exist_ok=True)
+        self._figure = Figure(figsize=(size, size), dpi=dpi)
+        self._canvas = FigureCanvasAgg(self._figure)
+        self._ax = layout_axes(self._figure, radius)
+        self._canvas.draw()
+
+
+    def update(self, shapes):
+        """Writes a frame if at least K shapes were placed since the last one
+
+        Args:
+            shapes (ShapeStore): placed shapes
+        """
+
+        if len(shapes) - self._drawn >= self._every:
+            self._frame(shapes)
+
+
+    def close(self, shapes):
+        """Writes the last frame if some shapes were placed since the previous one
+
+        Args:
+            shapes (ShapeStore): placed shapes
+        """
+
+        if len(shapes) > self._drawn:
+            self._frame(shapes)
+
+
+    def _frame(self, shapes):
+        """Draws shapes placed since the last frame over it and writes the canvas
+
+        Args:
+            shapes (ShapeStore): placed shapes
+        """
+
+        collection = add_shapes(self._ax, shapes, self._color_by, self._drawn, self._scale)
+        self._ax.draw_artist(collection)
+        self._drawn = len(shapes)
+
+        path = os.path.join(self._directory, f'frame_{self._drawn:06d}.png')
+        matplotlib.image.imsave(path, np.asarray(self._canvas.buffer_rgba()))
+        self.frames.append(path)
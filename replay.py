@@ -0,0 +1,186 @@
+import os
+from typing import List
+
+import numpy as np
+
+from mocker import ShapeGenerator, Symmetry
+
+
+# magic, version, vertices per shape, rotations and radius of the generator
+HEADER = np.dtype([('magic', 'S4'), ('version', '<u2'), ('k', '<u2'), ('rotations', '<u2'), ('pad', '<u2'),
+                   ('radius', '<f8'), ('reserved', '<u8')])
+MAGIC = b'PTRC'
+VERSION = 1
+
+
+def record_dtype(k : int):
+    """Type of a single record of a trace
+
+    Args:
+        k (int): number of vertices stored per shape
+
+    Returns:
+        np.dtype: generated shape(padded by its last vertex), its number of vertices, placement and time taken
+    """
+
+    return np.dtype([('vertices', '<f8', (k, 2)), ('size', '<u2'), ('placed', 'u1'), ('pad', 'u1', 5),
+                     ('x', '<f8'), ('y', '<f8'), ('rotation', '<i4'), ('pad2', 'u1', 4), ('time', '<f8')])
+
+
+class TraceWriter(object):
+    """Appends generated shapes, their placements and times to a binary trace.
+
+    The trace is a fixed-size header followed by fixed-size records, so it can be memory-mapped
+    by read_trace without parsing. Every record is flushed as it is written, a trace of an interrupted
+    run stays readable. Appending to an existing trace requires the same generator settings.
+    """
+
+    def __init__(self, path : str, radius : float, rotations : int, k : int = 4):
+        """Constructor
+
+        Args:
+            path (str): path of the trace, created if missing
+            radius (float): radius of the generator
+            rotations (int): rotations of the generator
+            k (int, optional): largest number of vertices of a shape. Defaults to 4.
+        """
+
+        self._dtype = record_dtype(k)
+        self._k = k
+        self.count = 0
+
+        if os.path.exists(path) and os.path.getsize(path) >= HEADER.itemsize:
+            header = read_header(path)
+            if (int(header['k']), int(header['rotations']), float(header['radius'])) != (k, int(rotations), float(radius)):
+                raise ValueError(f"Trace {path} was recorded with other settings")
+            self._file = open(path, 'r+b')
+            # drop a partially written last record
+            self.count = (os.path.getsize(path) - HEADER.itemsize) // self._dtype.itemsize
+            self._file.truncate(HEADER.itemsize + self.count * self._dtype.itemsize)
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self._file = open(path, 'wb')
+            header = np.zeros(1, HEADER)
+            header[0] = (MAGIC, VERSION, k, int(rotations), 0, radius, 0)
+            self._file.write(header.tobytes())
+            self._file.flush()
+
+
+    def write(self, shape : List, time : float, x : float = np.nan, y : float = np.nan, rotation : int = 0, placed : bool = True):
+        """Appends a record
+
+        Args:
+            shape (List(List(int, int))): generated shape
+            time (float): seconds between generating and placing the shape
+            x (float, optional): x coordinate of the first point of the placed shape. Defaults to NaN.
+            y (float, optional): y coordinate of the first point of the placed shape. Defaults to NaN.
+            rotation (int, optional): rotation of the placed shape in degrees. Defaults to 0.
+            placed (bool, optional): whether the shape was placed. Defaults to True.
+        """
+
+        self.check(shape)
+        n = len(shape)
+        record = np.zeros(1, self._dtype)
+        record['vertices'][0, :n] = shape
+        record['vertices'][0, n:] = shape[-1]
+        record['size'], record['placed'], record['time'] = n, placed, time
+        record['x'], record['y'], record['rotation'] = x, y, rotation
+        self._file.write(record.tobytes())
+        self._file.flush()
+        self.count += 1
+
+
+    def check(self, shape : List):
+        """Raises ValueError if a shape does not fit into a record
+
+        Args:
+            shape (List(List(int, int))): shape
+        """
+
+        if len(shape) > self._k:
+            raise ValueError(f"Shape has {len(shape)} vertices, the trace stores at most {self._k}")
+
+
+    def close(self):
+        """Closes the trace file"""
+
+        self._file.close()
+
+
+def read_header(path : str):
+    """Header of a trace
+
+    Args:
+        path (str): path of the trace
+
+    Returns:
+        np.void: magic, version, k, rotations and radius
+    """
+
+    header = np.fromfile(path, dtype=HEADER, count=1)
+    if not len(header) or header[0]['magic'] != MAGIC:
+        raise ValueError(f"{path} is not a placement trace")
+    if header[0]['version'] != VERSION:
+        raise ValueError(f"Unsupported trace version {header[0]['version']}")
+    return header[0]
+
+
+def read_trace(path : str):
+    """Memory-maps the records of a trace
+
+    Args:
+        path (str): path of the trace
+
+    Returns:
+        np.void: header of the trace
+        np.memmap: records, fields vertices, size, placed, x, y, rotation and time
+    """
+
+    header = read_header(path)
+    dtype = record_dtype(int(header['k']))
+    count = (os.path.getsize(path) - HEADER.itemsize) // dtype.itemsize
+    if not count:
+        return header, np.zeros(0, dtype)
+    return header, np.memmap(path, dtype=dtype, mode='r', offset=HEADER.itemsize, shape=(count,))
+
+
+class TraceExhausted(Exception):
+    """Raised when a replayed trace has no more shapes."""
+    pass
+
+
+class ReplayShapeGenerator(ShapeGenerator):
+    """Generates the shapes of a recorded trace in their order, so different placers get identical workloads"""
+
+    def __init__(self, path : str, radius : float = None, rotations : Symmetry = None):
+        """Constructor
+
+        Args:
+            path (str): path of the trace
+            radius (float, optional): radius of the circle. Defaults to None, the recorded one.
+            rotations (Symmetry, optional): allowed rotations. Defaults to None, the recorded ones.
+        """
+
+        header, self._records = read_trace(path)
+        super().__init__(float(header['radius']) if radius is None else radius,
+                         Symmetry(int(header['rotations'])) if rotations is None else rotations)
+        self._next = 0
+
+
+    @property
+    def records(self):
+        """Recorded shapes, placements and times
+
+        Returns:
+            np.memmap: records of the trace
+        """
+
+        return self._records
+
+
+    def _get_shape(self):
+        if self._next >= len(self._records):
+            raise TraceExhausted(f"All {len(self._records)} recorded shapes were generated")
+        record = self._records[self._next]
+        self._next += 1
+        return record['vertices'][:record['size']].tolist()
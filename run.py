@@ -1,27 +1,52 @@
+"""Competition runner.
+
+Runs the competition generators, optionally over grids of seeds and radii, in a pool of processes.
+Results of runs are printed as they finish and optionally written to a JSON lines file.
+
+    python run.py
+    python run.py --workers 4 --scenario SG2 SG4 --seed 1 2 3 4 --radius 10 12 --out runs.jsonl
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import os
+
 from myplacer import MyPlacer
 from mocker import RandomShapeGenerator, Symmetry, SquareShapeGenerator
 from timeit import default_timer as timer
 
 
-class SG1(RandomShapeGenerator):
-    def __init__(self):
-        super().__init__(radius = 10, rotations = Symmetry.none, fixed_seed = 111)
+class CompetitionGenerator(RandomShapeGenerator):
+    """Random shapes with the symmetry, seed and radius of a competition scenario, seed and radius can be overridden"""
+
+    rotations = Symmetry.none
+    seed = None
+    radius = 10
+
+    def __init__(self, radius : float = None, seed : int = None):
+        super().__init__(radius = self.radius if radius is None else radius, rotations = self.rotations,
+                         fixed_seed = self.seed if seed is None else seed)
 
-class SG2(RandomShapeGenerator):
-    def __init__(self):
-        super().__init__(radius = 10, rotations = Symmetry.twofold, fixed_seed = 121)
+class SG1(CompetitionGenerator):
+    rotations = Symmetry.none
+    seed = 111
 
-class SG3(RandomShapeGenerator):
-    def __init__(self):
-        super().__init__(radius = 10, rotations = Symmetry.threefold, fixed_seed = 113)
+class SG2(CompetitionGenerator):
+    rotations = Symmetry.twofold
+    seed = 121
 
-class SG4(RandomShapeGenerator):
-    def __init__(self):
-        super().__init__(radius = 10, rotations = Symmetry.sixfold, fixed_seed = 114)
+class SG3(CompetitionGenerator):
+    rotations = Symmetry.threefold
+    seed = 113
 
-class SG5(RandomShapeGenerator):
-    def __init__(self):
-        super().__init__(radius = 10, rotations = Symmetry.fourfold, fixed_seed = 115)
+class SG4(CompetitionGenerator):
+    rotations = Symmetry.sixfold
+    seed = 114
+
+class SG5(CompetitionGenerator):
+    rotations = Symmetry.fourfold
+    seed = 115
 
 SFG_competition = [
     SG1,
@@ -31,21 +56,89 @@ SFG_competition = [
     SG5,
 ]
 
-start = timer()
+SCENARIOS = {sg.__name__: sg for sg in SFG_competition}
+
+
+def run_scenario(name : str, seed : int = None, radius : float = None):
+    """Fills the circle of a scenario
+
+    Args:
+        name (str): name of a competition generator
+        seed (int, optional): seed overriding the scenario's one. Defaults to None.
+        radius (float, optional): radius overriding the scenario's one. Defaults to None.
+
+    Returns:
+        dict: scenario, seed, radius, placed shapes, filled area and time taken
+    """
+
+    sg = SCENARIOS[name](radius=radius, seed=seed)
+    start = timer()
+    sg = MyPlacer(sg).run()
+    end = timer()
+    return {'scenario': name, 'seed': SCENARIOS[name].seed if seed is None else seed, 'radius': sg._radius,
+            'shapes': sg.placed_shapes, 'filled': float(sg.filled_area), 'time': end - start}
+
+
+def runs(scenarios : list, seeds : list = None, radii : list = None):
+    """Runs of the selected scenarios over the grid of seeds and radii
+
+    Returns:
+        List(Tuple(str, int, float)): scenario, seed and radius of every run, None keeps the scenario's value
+    """
+
+    return [(name, seed, radius) for name in scenarios for seed in (seeds or [None]) for radius in (radii or [None])]
+
+
+def main(argv : list = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of processes, runs in this process if 1')
+    parser.add_argument('--scenario', nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument('--seed', nargs='+', type=int, help='seeds replacing the ones of the scenarios')
+    parser.add_argument('--radius', nargs='+', type=float, help='radii replacing the ones of the scenarios')
+    parser.add_argument('--out', help='JSON lines file results of runs are appended to')
+    args = parser.parse_args(argv)
+
+    tasks = runs(args.scenario, args.seed, args.radius)
+    results = [None] * len(tasks)
+    out = open(args.out, 'a') if args.out else None
+
+    def finished(i, result):
+        results[i] = result
+        print(f"{result['scenario']} seed={result['seed']} r={result['radius']}: {result['shapes']} shapes, "
+              f"filled {result['filled']:.4f}, {result['time']:.2f}s", flush=True)
+        if out is not None:
+            out.write(json.dumps(result) + '\n')
+            out.flush()
+
+    start = timer()
+    try:
+        if args.workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(min(args.workers, len(tasks))) as executor:
+                futures = {executor.submit(run_scenario, *task): i for i, task in enumerate(tasks)}
+                for future in as_completed(futures):
+                    finished(futures[future], future.result())
+        else:
+            for i, task in enumerate(tasks):
+                finished(i, run_scenario(*task))
+    finally:
+        if out is not None:
+            out.close()
+    end = timer()
 
+    filled = [r['filled'] for r in results]
+    shapes = sum(r['shapes'] for r in results)
+    time = sum(r['time'] for r in results)
 
-filled = []
-shapes = []
-for i, o in enumerate(SFG_competition):
-    mp = MyPlacer(o())
-    sg = mp.run()
-    filled.append(sg.filled_area)
-    shapes.append(sg.placed_shapes)
-    print("SG done")
-end = timer()
+    if len(tasks) > len(args.scenario):
+        for name in args.scenario:
+            scenario = [r['filled'] for r in results if r['scenario'] == name]
+            print(f"{name}: average filled area {sum(scenario)/len(scenario)} over {len(scenario)} runs")
 
+    print(f"Competition ended, my scores are: {filled}")
+    print(f"Average filled area: {sum(filled)/len(filled)}")
+    print(f"Time taken: {time}s, that is {time / shapes}s per shape") # Time in seconds, e.g. 5.38091952400282
+    print(f"Wall time: {end - start}s with {min(args.workers, len(tasks))} workers")
 
 
-print(f"Competition ended, my scores are: {filled}")
-print(f"Average filled area: {sum(filled)/len(filled)}")
-print(f"Time taken: {end - start}s, that is {(end - start) / sum(shapes)}s per shape") # Time in seconds, e.g. 5.38091952400282
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+
+from typing import Callable
+
+from nfp import inside_pairs
+
+
+def lowest_feasible_point(vertices : np.ndarray, active : np.ndarray, ifp : Polygon, tolerance : float = 1e-9, chunk : int = 64,
+                          count : int = None, interrupted : Callable = None):
+    """Finds the lowest, then leftmost point where a shape can be placed without building the union of NFPs.
+
+    Candidates are vertices of active NFPs and crossings of their boundaries. They are generated
+    in increasing y order: vertices are sorted once, crossings of a pair of NFPs are computed only
+    when the search reaches the bottom of the pair's common bounding box. Candidates are tested in
+    growing chunks against all NFPs through a spatial index, the search stops at the first chunk
+    which contains a feasible point, or enough of them if several are asked for.
+
+    Args:
+        vertices (np.ndarray): (N, k, 2) vertices of NFPs of all shapes that can block the new shape
+        active (np.ndarray): indices of NFPs whose boundaries give candidate points
+        ifp (Polygon): inner fit polygon of the new shape
+        tolerance (float, optional): distance from an NFP boundary under which a point is considered outside. Defaults to 1e-9.
+        chunk (int, optional): number of vertices tested in the first chunk. Defaults to 64.
+        count (int, optional): number of lowest feasible points returned as a list. Defaults to None, the lowest one alone.
+        interrupted (Callable, optional): checked before every chunk, the search gives up with the points found so far
+            when it returns True. Defaults to None.
+
+    Returns:
+        Tuple(int, int): lowest feasible point, None if there is none, or a list of up to count lowest ones
+    """
+
+    polygons = shapely.polygons(vertices)
+    tree = shapely.STRtree(polygons)
+    shapely.prepare(ifp)
+
+    # vertices of active NFPs in increasing y order
+    points = vertices[active].reshape(-1, 2)
+    points = points[np.lexsort((points[:, 0], points[:, 1]))]
+
+    # pairs of active NFPs whose bounding boxes overlap, ordered by the bottom of their common bounding box
+    nfps = vertices[active]
+    boxes = polygons[active]
+    first, second = shapely.STRtree(boxes).query(boxes)
+    first, second = first[first < second], second[first < second]
+    lower = np.maximum(nfps[first, :, 1].min(axis=1), nfps[second, :, 1].min(axis=1))
+    order = np.argsort(lower, kind='stable')
+    first, second, lower = first[order], second[order], lower[order]
+
+    crossings = np.zeros((0, 2))
+    feasible = []
+    start, paired = 0, 0
+    while start < len(points) or paired < len(lower) or len(crossings):
+        if interrupted is not None and interrupted():
+            break
+        # extend the chunk by vertices at the same height as its last vertex
+        end = min(start + chunk, len(points))
+        if end < len(points):
+            end = np.searchsorted(points[:, 1], points[end - 1, 1], side='right')
+        top = points[end - 1, 1] if end > start else np.inf
+
+        # crossings of all pairs which can have a crossing under the top of the chunk
+        stop = np.searchsorted(lower, top, side='right')
+        if stop > paired:
+            found = boundary_crossings(nfps[first[paired:stop]], nfps[second[paired:stop]])
+            crossings = np.concatenate((crossings, found))
+            paired = stop
+        if end == len(points) and paired == len(lower):
+            top = np.inf
+
+        below = crossings[:, 1] <= top
+        candidates = np.concatenate((points[start:end], crossings[below]))
+        crossings = crossings[~below]
+        start, chunk = end, chunk * 2
+
+        # later chunks lie above the top of this one
+        valid = _valid(candidates, vertices, tree, ifp, tolerance)
+        if count is None and len(valid):
+            return tuple(valid[0])
+        if count is not None:
+            # vertices of touching NFPs and crossings can coincide
+            valid = np.unique(valid, axis=0)
+            valid = valid[np.lexsort((valid[:, 0], valid[:, 1]))]
+            feasible.extend(map(tuple, valid[:count - len(feasible)].tolist()))
+            if len(feasible) == count:
+                return feasible
+
+    return None if count is None else feasible
+
+
+def boundary_crossings(first : np.ndarray, second : np.ndarray):
+    """Points where edges of pairs of polygons properly cross each other. Touching and overlapping
+    edges give no crossing, their common points are vertices of one of the polygons.
+
+    Args:
+        first (np.ndarray): (M, k, 2) vertices of first polygons of the pairs
+        second (np.ndarray): (M, k, 2) vertices of second polygons of the pairs
+
+    Returns:
+        np.ndarray: (C, 2) array of crossings
+    """
+
+    # edges of the first polygon along axis 1, of the second one along axis 2
+    a = first[:, :, None, :]
+    b = second[:, None, :, :]
+    da = np.roll(first, -1, axis=1)[:, :, None, :] - a
+    db = np.roll(second, -1, axis=1)[:, None, :, :] - b
+    ab = b - a
+
+    denominator = da[..., 0] * db[..., 1] - da[..., 1] * db[..., 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (ab[..., 0] * db[..., 1] - ab[..., 1] * db[..., 0]) / denominator
+        u = (ab[..., 0] * da[..., 1] - ab[..., 1] * da[..., 0]) / denominator
+    # parallel and zero-length edges have a zero denominator and fail the comparisons
+    crossing = (t > 0) & (t < 1) & (u > 0) & (u < 1)
+
+    m, i, j = np.nonzero(crossing)
+    return first[m, i] + t[m, i, j, None] * da[m, i, 0]
+
+
+def _valid(candidates : np.ndarray, vertices : np.ndarray, tree : shapely.STRtree, ifp : Polygon, tolerance : float):
+    """Candidates inside the IFP and outside all NFPs, lowest, then leftmost first
+
+    Args:
+        candidates (np.ndarray): (P, 2) array of points
+        vertices (np.ndarray): (N, k, 2) vertices of NFPs
+        tree (STRtree): spatial index of the NFPs
+        ifp (Polygon): inner fit polygon
+        tolerance (float): distance from an NFP boundary under which a point is considered outside
+
+    Returns:
+        np.ndarray: (V, 2) array of valid candidates
+    """
+
+    if not len(candidates):
+        return candidates.reshape(0, 2)
+    candidates = candidates[shapely.intersects_xy(ifp, candidates[:, 0], candidates[:, 1])]
+    if not len(candidates):
+        return candidates
+
+    p, n = tree.query(shapely.points(candidates))
+    blocked = np.zeros(len(candidates), dtype=bool)
+    blocked[p[inside_pairs(candidates, vertices, p, n, tolerance)]] = True
+    candidates = candidates[~blocked]
+    return candidates[np.lexsort((candidates[:, 0], candidates[:, 1]))]
@@ -0,0 +1,340 @@
+"""Placement service.
+
+An asyncio server hosting independent wafer sessions over a local TCP or Unix socket. Requests and
+responses are JSON objects, one per line:
+
+    {"op": "open", "radius": 10, "rotations": 120, "options": {"search": "heap"}}  -> {"session": "..."}
+    {"op": "place", "session": "...", "shape": [[x, y], ...], "deadline": 0.5}   -> {"placed": true, "x": .., "y": .., "rotation": .., "time": ..}
+    {"op": "query", "session": "...", "shapes": [[[x, y], ...], ...]}              -> {"candidates": [{"fits": true, "x": .., "y": .., "rotation": .., "top": ..}, ...]}
+    {"op": "stats", "session": "..."}                                             -> {"shapes": .., "filled": ..}
+    {"op": "close", "session": "..."}                                             -> {"closed": true}
+
+An "id" given in a request is returned in its response. Every session lives in one of the worker
+processes, so placements of a busy session only delay sessions sharing its worker. Requests of a
+connection are answered in order and the number of placements in progress is bounded, a client
+that sends faster than the server places is slowed down by its socket. Requests are validated before
+they reach a session, and a placement that fails leaves the session's layout as it was.
+
+    python service.py serve --port 8765 --workers 4 --session-workers 2
+    python service.py load --port 8765 --sessions 8 --shapes 200
+"""
+
+import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+from random import Random
+from time import perf_counter
+import uuid
+
+import numpy as np
+from shapely.geometry import Polygon
+from shapely.validation import explain_validity
+
+from mocker import Symmetry
+from nfp import MAX_TOLERANCE
+
+
+# placers of the sessions living in a worker process
+_SESSIONS = {}
+
+# constructor options a client may set and their types, processes of a session are set by the server
+_OPTIONS = {'ifp_segments': int, 'search': str, 'deadline': float, 'grid': int, 'nfp_cache': int,
+            'nfp_tolerance': float}
+
+
+def _open_session(session : str, radius : float, rotations : int, options : dict, workers : int = 0):
+    """Creates the placer of a session, runs in a worker process"""
+
+    from myplacer import MyPlacer
+
+    placer = MyPlacer.streaming(radius, rotations, workers=workers, **options)
+    # the pool of the session lives until it is closed
+    placer._open()
+    _SESSIONS[session] = placer
+    return {'session': session}
+
+
+def _place(session : str, shape : list, deadline : float = None):
+    """Places a shape in a session, runs in a worker process"""
+
+    placer = _SESSIONS[session]
+    # the deadline of this request replaces the session's one
+    default, placer._deadline = placer._deadline, deadline if deadline is not None else placer._deadline
+    cut = len(placer.cut_short)
+    try:
+        decision = placer.place(shape)
+    finally:
+        placer._deadline = default
+    return {'placed': decision.placed, 'x': decision.x, 'y': decision.y, 'rotation': decision.rotation,
+            'time': decision.time, 'cut_short': len(placer.cut_short) > cut}
+
+
+def _query(session : str, shapes : list):
+    """Best placements of shapes in a session without placing them, runs in a worker process"""
+
+    candidates = _SESSIONS[session].query(shapes)
+    return {'candidates': [{'fits': c.fits, 'x': c.x, 'y': c.y, 'rotation': c.rotation, 'top': c.top} for c in candidates]}
+
+
+def _session_stats(session : str):
+    """Placed shapes and filled area of a session, runs in a worker process"""
+
+    sg = _SESSIONS[session]._sg
+    return {'shapes': sg.placed_shapes, 'filled': float(sg.filled_area)}
+
+
+def _close_session(session : str):
+    """Drops the placer of a session, runs in a worker process"""
+
+    placer = _SESSIONS.pop(session, None)
+    if placer is not None:
+        placer._close()
+    return {'closed': True}
+
+
+def _number(value, name : str, positive : bool = True):
+    """Number given in a request, raises ValueError if it is not a finite(positive) number"""
+
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value) or (positive and value <= 0):
+        raise ValueError(f"{name} has to be a {'positive ' if positive else ''}number, got {value!r}")
+    return value
+
+
+def _checked_options(options : dict):
+    """Placer options given in a request, raises ValueError for unknown options and values of wrong types"""
+
+    if not isinstance(options, dict):
+        raise ValueError(f"options have to be an object, got {options!r}")
+    for name, value in options.items():
+        if name not in _OPTIONS:
+            raise ValueError(f"Unknown option {name}, expected one of {', '.join(_OPTIONS)}")
+        if _OPTIONS[name] is float:
+            _number(value, name)
+        elif _OPTIONS[name] is int and (isinstance(value, bool) or not isinstance(value, int) or value < 0):
+            raise ValueError(f"{name} has to be a non-negative integer, got {value!r}")
+        elif not isinstance(value, _OPTIONS[name]):
+            raise ValueError(f"{name} has to be a {_OPTIONS[name].__name__}, got {value!r}")
+    # coarser tessellations and grids are too costly to place against or useless
+    if options.get('ifp_segments', 8) < 8:
+        raise ValueError(f"ifp_segments has to be at least 8, got {options['ifp_segments']!r}")
+    if options.get('grid', 0) == 1:
+        raise ValueError("grid has to be 0 or at least 2, got 1")
+    if options.get('nfp_tolerance', MAX_TOLERANCE) > MAX_TOLERANCE:
+        raise ValueError(f"nfp_tolerance has to be at most {MAX_TOLERANCE}, got {options['nfp_tolerance']!r}")
+    return options
+
+
+def _checked_shape(shape):
+    """Shape given in a request, raises ValueError unless its vertices form a valid polygon with an area"""
+
+    if not isinstance(shape, list) or len(shape) < 3 or not all(isinstance(p, list) and len(p) == 2 for p in shape):
+        raise ValueError("A shape has to be a list of at least 3 [x, y] vertices")
+    for p in shape:
+        _number(p[0], 'x', positive=False)
+        _number(p[1], 'y', positive=False)
+    polygon = Polygon(shape)
+    if not polygon.is_valid or polygon.area <= 0:
+        raise ValueError(f"Shape is not a valid polygon: {explain_validity(polygon)}")
+    return shape
+
+
+class PlacementService(object):
+    """Sessions distributed over single-process workers, each worker holds the placers of its sessions"""
+
+    def __init__(self, workers : int = None, max_pending : int = 64, session_workers : int = 0):
+        """Constructor
+
+        Args:
+            workers (int, optional): number of worker processes. Defaults to None, number of CPUs.
+            max_pending (int, optional): number of requests being processed at once. Defaults to 64.
+            session_workers (int, optional): number of processes evaluating orientations of a shape in every session,
+                orientations are evaluated in the worker of the session if less than 2. Defaults to 0.
+        """
+
+        self._workers = [ProcessPoolExecutor(1) for _ in range(workers or os.cpu_count())]
+        self._session_workers = session_workers
+        self._load = [0] * len(self._workers)
+        self._sessions = {}
+        self._pending = asyncio.Semaphore(max_pending)
+
+
+    async def handle(self, request : dict):
+        """Answers a single request
+
+        Args:
+            request (dict): decoded request
+
+        Returns:
+            dict: response
+        """
+
+        op = request.get('op')
+        if op == 'open':
+            radius = _number(request.get('radius'), 'radius')
+            rotations = request.get('rotations', 360)
+            if rotations not in {int(s) for s in Symmetry}:
+                raise ValueError(f"rotations have to be one of {', '.join(str(int(s)) for s in Symmetry)}, got {rotations!r}")
+            options = _checked_options(request.get('options', {}))
+            session = uuid.uuid4().hex
+            worker = min(range(len(self._workers)), key=self._load.__getitem__)
+            self._load[worker] += 1
+            self._sessions[session] = worker
+            try:
+                return await self._call(session, _open_session, session, radius, rotations, options, self._session_workers)
+            except BaseException:
+                self._forget(session)
+                raise
+
+        session = request.get('session')
+        if session not in self._sessions:
+            return {'error': f"Unknown session {session}"}
+        if op == 'place':
+            deadline = request.get('deadline')
+            if deadline is not None:
+                _number(deadline, 'deadline')
+            return await self._call(session, _place, session, _checked_shape(request.get('shape')), deadline)
+        if op == 'query':
+            shapes = request.get('shapes')
+            if not isinstance(shapes, list):
+                raise ValueError("shapes have to be a list of shapes")
+            return await self._call(session, _query, session, [_checked_shape(shape) for shape in shapes])
+        if op == 'stats':
+            return await self._call(session, _session_stats, session)
+        if op == 'close':
+            response = await self._call(session, _close_session, session)
+            self._forget(session)
+            return response
+        return {'error': f"Unknown operation {op}"}
+
+
+    async def serve_connection(self, reader : asyncio.StreamReader, writer : asyncio.StreamWriter):
+        """Answers requests of a connection in order until it is closed"""
+
+        try:
+            while line := await reader.readline():
+                request = {}
+                try:
+                    request = json.loads(line)
+                    response = await self.handle(request)
+                except Exception as e:
+                    response = {'error': repr(e)}
+                if isinstance(request, dict) and 'id' in request:
+                    response['id'] = request['id']
+                writer.write((json.dumps(response) + '\n').encode())
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+    def close(self):
+        """Shuts the workers down"""
+
+        for worker in self._workers:
+            worker.shutdown(cancel_futures=True)
+
+
+    async def _call(self, session : str, function, *args):
+        """Runs a function in the worker of a session, waits while too many requests are in progress"""
+
+        async with self._pending:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._workers[self._sessions[session]], function, *args)
+
+
+    def _forget(self, session : str):
+        worker = self._sessions.pop(session, None)
+        if worker is not None:
+            self._load[worker] -= 1
+
+
+async def serve(args):
+    service = PlacementService(args.workers, args.max_pending, args.session_workers)
+    if args.unix:
+        server = await asyncio.start_unix_server(service.serve_connection, path=args.unix)
+    else:
+        server = await asyncio.start_server(service.serve_connection, host=args.host, port=args.port)
+    print(f"Serving on {args.unix or f'{args.host}:{args.port}'} with {len(service._workers)} workers", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+async def _connect(args):
+    if args.unix:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(args.host, args.port)
+
+
+async def _request(reader, writer, request : dict):
+    writer.write((json.dumps(request) + '\n').encode())
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+async def _load_session(args, seed : int, latencies : list):
+    """Feeds random shapes to one session and records the latency of every placement"""
+
+    reader, writer = await _connect(args)
+    random = Random(seed).random
+    try:
+        session = (await _request(reader, writer, {'op': 'open', 'radius': args.radius, 'rotations': args.rotations}))['session']
+        for _ in range(args.shapes):
+            shape = [[random(), random()], [-random(), random()], [-random(), -random()], [random(), -random()]]
+            start = perf_counter()
+            response = await _request(reader, writer, {'op': 'place', 'session': session, 'shape': shape, 'deadline': args.deadline})
+            latencies.append(perf_counter() - start)
+            if 'error' in response:
+                raise RuntimeError(response['error'])
+        await _request(reader, writer, {'op': 'close', 'session': session})
+    finally:
+        writer.close()
+
+
+async def load(args):
+    """Load test: concurrent sessions each placing random shapes, reports throughput and tail latency"""
+
+    latencies = []
+    start = perf_counter()
+    await asyncio.gather(*(_load_session(args, seed, latencies) for seed in range(args.sessions)))
+    elapsed = perf_counter() - start
+
+    latencies = np.array(latencies)
+    print(f"{len(latencies)} placements in {elapsed:.2f}s over {args.sessions} sessions, {len(latencies) / elapsed:.1f} placements/s")
+    print(f"latency p50 {np.percentile(latencies, 50)*1000:.1f} ms, p95 {np.percentile(latencies, 95)*1000:.1f} ms, "
+          f"p99 {np.percentile(latencies, 99)*1000:.1f} ms, max {latencies.max()*1000:.1f} ms")
+
+
+def main(argv : list = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name, func in (('serve', serve), ('load', load)):
+        command = commands.add_parser(name)
+        command.add_argument('--host', default='127.0.0.1')
+        command.add_argument('--port', type=int, default=8765)
+        command.add_argument('--unix', help='path of a Unix socket used instead of TCP')
+        command.set_defaults(func=func)
+        if name == 'serve':
+            command.add_argument('--workers', type=int, help='number of worker processes, defaults to the number of CPUs')
+            command.add_argument('--max-pending', type=int, default=64, help='number of requests processed at once')
+            command.add_argument('--session-workers', type=int, default=0,
+                                 help='number of processes evaluating orientations in every session, defaults to none')
+        else:
+            command.add_argument('--sessions', type=int, default=8)
+            command.add_argument('--shapes', type=int, default=100, help='shapes placed in every session')
+            command.add_argument('--radius', type=float, default=10)
+            command.add_argument('--rotations', type=int, default=120)
+            command.add_argument('--deadline', type=float, help='deadline of every placement in seconds')
+
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(args.func(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
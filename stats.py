@@ -0,0 +1,243 @@
+import heapq
+import json
+from collections import defaultdict
+from contextlib import nullcontext
+from time import perf_counter
+
+
+# context returned by a disabled collector, entering it does nothing
+_NULL = nullcontext()
+
+
+class _Phase(object):
+    """Timer of one phase, adds its time to the current shape and orientation"""
+
+    __slots__ = ('_stats', '_name', '_start')
+
+    def __init__(self, stats, name : str):
+        self._stats = stats
+        self._name = name
+        self._start = 0
+
+
+    def __enter__(self):
+        self._start = perf_counter()
+        return self
+
+
+    def __exit__(self, *exc):
+        self._stats._add(self._name, perf_counter() - self._start)
+        return False
+
+
+class _Orientation(object):
+    """Record of one orientation of a shape, open while the orientation is evaluated"""
+
+    __slots__ = ('_stats', '_start')
+
+    def __init__(self, stats):
+        self._stats = stats
+        self._start = 0
+
+
+    def __enter__(self):
+        self._start = perf_counter()
+        self._stats._orientation = {'time': 0, 'phases': defaultdict(float), 'counts': defaultdict(int)}
+        return self
+
+
+    def __exit__(self, *exc):
+        record = self._stats._orientation
+        record['time'] = perf_counter() - self._start
+        self._stats._orientation = None
+        if self._stats._shape is not None:
+            self._stats._shape['orientations'].append(record)
+        return False
+
+
+class PlacementStats(object):
+    """Per-phase timers and counters of a placer, per shape and per orientation.
+
+    Phases(ifp, grid, nfp, union, clip, select, search, cache, validate) are timed by entering phase(name),
+    counters(NFP vertices, union pieces, ...) are summed by count(name, value). A disabled collector
+    returns a shared empty context and ignores counts, so instrumented code costs a method call.
+    A record of every shape is kept, optionally written as a JSON line, and the slowest shapes
+    can be profiled by cProfile.
+    """
+
+    def __init__(self, enabled : bool = True, jsonl : str = None, profile : int = 0):
+        """Constructor
+
+        Args:
+            enabled (bool, optional): whether anything is collected. Defaults to True.
+            jsonl (str, optional): path of a file records of shapes are appended to as JSON lines. Defaults to None.
+            profile (int, optional): number of the slowest shapes whose cProfile is kept. Defaults to 0.
+        """
+
+        self.enabled = enabled
+        self._path = jsonl
+        self._file = None
+        self._profile = profile
+        self._profiler = None
+        # heap of (time, index, pstats.Stats) of the slowest shapes
+        self._profiles = []
+
+        self.shapes = []
+        self._shape = None
+        self._orientation = None
+        self._start = 0
+
+
+    def begin_shape(self):
+        """Opens a record of a new shape"""
+
+        if not self.enabled:
+            return
+        self._shape = {'shape': len(self.shapes), 'placed': False, 'time': 0,
+                       'phases': defaultdict(float), 'counts': defaultdict(int), 'orientations': []}
+        if self._profile > 0:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._start = perf_counter()
+
+
+    def end_shape(self, placed : bool):
+        """Closes the record of the current shape
+
+        Args:
+            placed (bool): whether the shape was placed
+        """
+
+        if not self.enabled or self._shape is None:
+            return
+        record, self._shape = self._shape, None
+        record['time'] = perf_counter() - self._start
+        record['placed'] = placed
+        self.shapes.append(record)
+
+        if self._profiler is not None:
+            import pstats
+            self._profiler.disable()
+            entry = (record['time'], record['shape'], pstats.Stats(self._profiler))
+            self._profiler = None
+            if len(self._profiles) < self._profile:
+                heapq.heappush(self._profiles, entry)
+            elif entry[:2] > self._profiles[0][:2]:
+                heapq.heapreplace(self._profiles, entry)
+
+        if self._path is not None:
+            if self._file is None:
+                self._file = open(self._path, 'a')
+            self._file.write(json.dumps(record) + '\n')
+            self._file.flush()
+
+
+    def orientation(self):
+        """Context of an evaluated orientation of the current shape
+
+        Returns:
+            context manager: opens and closes a record of the orientation
+        """
+
+        if not self.enabled:
+            return _NULL
+        return _Orientation(self)
+
+
+    def phase(self, name : str):
+        """Context timing a phase of the current shape
+
+        Args:
+            name (str): name of the phase
+
+        Returns:
+            context manager: adds the time spent inside of it to the phase
+        """
+
+        if not self.enabled:
+            return _NULL
+        return _Phase(self, name)
+
+
+    def count(self, name : str, value : int = 1):
+        """Adds to a counter of the current shape and orientation
+
+        Args:
+            name (str): name of the counter
+            value (int, optional): value to add. Defaults to 1.
+        """
+
+        if not self.enabled:
+            return
+        value = int(value)
+        if self._shape is not None:
+            self._shape['counts'][name] += value
+        if self._orientation is not None:
+            self._orientation['counts'][name] += value
+
+
+    def totals(self):
+        """Phase times and counters summed over all shapes
+
+        Returns:
+            dict: total time, time of every phase and every counter
+        """
+
+        phases, counts = defaultdict(float), defaultdict(int)
+        for record in self.shapes:
+            for name, value in record['phases'].items():
+                phases[name] += value
+            for name, value in record['counts'].items():
+                counts[name] += value
+        return {'shapes': len(self.shapes), 'time': sum(r['time'] for r in self.shapes),
+                'phases': dict(phases), 'counts': dict(counts)}
+
+
+    def slowest(self, n : int = 10):
+        """Records of the slowest shapes
+
+        Args:
+            n (int, optional): number of shapes. Defaults to 10.
+
+        Returns:
+            List(dict): records, the slowest first
+        """
+
+        return heapq.nlargest(n, self.shapes, key=lambda r: r['time'])
+
+
+    def profiles(self):
+        """cProfile statistics of the slowest shapes, if profiling is on
+
+        Returns:
+            List(Tuple(int, float, pstats.Stats)): index of the shape, its time and its statistics, the slowest first
+        """
+
+        return [(index, time, stats) for time, index, stats in sorted(self._profiles, key=lambda e: e[:2], reverse=True)]
+
+
+    def close(self):
+        """Closes the JSON lines file"""
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+    def _add(self, name : str, seconds : float):
+        """Adds time to a phase of the current shape and orientation
+
+        Args:
+            name (str): name of the phase
+            seconds (float): time spent in the phase
+        """
+
+        if self._shape is not None:
+            self._shape['phases'][name] += seconds
+        if self._orientation is not None:
+            self._orientation['phases'][name] += seconds
+
+
+# collector of placers that are not instrumented
+DISABLED = PlacementStats(enabled=False)